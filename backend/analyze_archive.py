@@ -0,0 +1,215 @@
+"""
+Bulk analyzer for contract archives.
+
+Run from the backend directory, e.g.:
+
+    python analyze_archive.py /data/contracts --output results.jsonl
+    python analyze_archive.py /data/contracts --output results.csv --format csv --resume
+
+Walks the directory tree, analyses every PDF, DOCX and TXT file on a
+process pool and appends one JSON record per document (JSONL) or one row
+per clause (CSV). Successfully analysed files are listed in a checkpoint
+file next to the output, so an interrupted run restarted with --resume
+skips them and retries the ones that failed. A retried document gets a
+new JSONL record after its error record; the last record for a path is
+the one that counts.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, Set
+
+EXTENSIONS = ('.pdf', '.docx', '.txt')
+# A failed document gets a single row with only its path and error
+CSV_FIELDS = ['path', 'index', 'type', 'risk_level', 'explanation', 'specific_concerns', 'text', 'error']
+# Futures kept in flight per worker, so huge archives are not all queued at once
+INFLIGHT_PER_WORKER = 4
+
+
+def iter_documents(root: str) -> Iterator[str]:
+    """
+    Yield supported documents under ``root`` as sorted relative paths
+    """
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(EXTENSIONS):
+                yield os.path.relpath(os.path.join(directory, filename), root)
+
+
+def analyze_document(root: str, relative_path: str, backend: str) -> Dict:
+    """
+    Parse, split and classify one document. Runs inside a pool worker.
+    """
+    from utils.document_parser import parse_document
+    from utils.chunker import split_into_clauses
+    from models.backends import get_backend
+
+    start = time.perf_counter()
+    record = {'path': relative_path}
+    try:
+        text = parse_document(os.path.join(root, relative_path))
+        clauses = split_into_clauses(text)
+        classifications = get_backend(backend).classify_batch(clauses)
+        record['clauses'] = [
+            dict(text=clause, **classification) for clause, classification in zip(clauses, classifications)
+        ]
+        record['status'] = 'success'
+    except Exception as e:
+        record['clauses'] = []
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['elapsed'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def init_worker() -> None:
+    import utils.document_parser
+
+    # Parse errors are reported in the output records
+    logging.disable(logging.ERROR)
+    # Documents already run in parallel; a page pool per PDF would oversubscribe
+    utils.document_parser.PARALLEL_MIN_PAGES = sys.maxsize
+
+
+class ResultWriter:
+    """
+    Appends records to the output and marks the paths of successful ones as
+    done in the checkpoint file, flushing both after every document
+    """
+
+    def __init__(self, output: str, fmt: str, checkpoint: str, resume: bool):
+        mode = 'a' if resume else 'w'
+        new_file = not resume or not os.path.exists(output) or os.path.getsize(output) == 0
+        self.fmt = fmt
+        self.output = open(output, mode, newline='' if fmt == 'csv' else None, encoding='utf-8')
+        self.checkpoint = open(checkpoint, mode, encoding='utf-8')
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.output, fieldnames=CSV_FIELDS)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, record: Dict) -> None:
+        if self.csv is not None:
+            if record['status'] != 'success':
+                self.csv.writerow({'path': record['path'], 'error': record.get('error')})
+            for index, clause in enumerate(record['clauses']):
+                row = {field: clause.get(field) for field in CSV_FIELDS}
+                row.update(path=record['path'], index=index,
+                           specific_concerns='; '.join(clause.get('specific_concerns', [])))
+                self.csv.writerow(row)
+        else:
+            self.output.write(json.dumps(record) + '\n')
+        self.output.flush()
+        if record['status'] == 'success':
+            self.checkpoint.write(record['path'] + '\n')
+            self.checkpoint.flush()
+
+    def close(self) -> None:
+        self.output.close()
+        self.checkpoint.close()
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as file:
+        return {line.rstrip('\n') for line in file if line.strip()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse every contract in a directory tree')
+    parser.add_argument('root', help='directory to scan for PDF, DOCX and TXT files')
+    parser.add_argument('--output', required=True, help='output file')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl',
+                        help='jsonl: one record per document, csv: one row per clause')
+    parser.add_argument('--checkpoint', help='list of successfully analysed files (default: <output>.done)')
+    parser.add_argument('--resume', action='store_true', help='skip files listed in the checkpoint, retry failed ones and append')
+    parser.add_argument('--backend', default=os.environ.get('CLASSIFIER_BACKEND', 'rules'),
+                        help='classifier backend (rules, vector)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--progress-interval', type=float, default=2.0, help='seconds between progress lines')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    checkpoint = args.checkpoint or args.output + '.done'
+    done = load_checkpoint(checkpoint) if args.resume else set()
+
+    paths = [path for path in iter_documents(args.root) if path not in done]
+    print(f"{len(paths)} documents to analyse ({len(done)} already done)", file=sys.stderr)
+
+    writer = ResultWriter(args.output, args.format, checkpoint, args.resume)
+    documents = clauses = failures = 0
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"{'done' if final else 'progress'}: {documents}/{len(paths)} documents, {clauses} clauses, "
+              f"{failures} failed, {documents / elapsed:.1f} docs/s, {clauses / elapsed:.1f} clauses/s",
+              file=sys.stderr)
+
+    def new_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker)
+
+    try:
+        executor = new_executor()
+        try:
+            queue = iter(paths)
+            pending: Dict[Future, str] = {}
+            while True:
+                while len(pending) < args.workers * INFLIGHT_PER_WORKER:
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    try:
+                        future = executor.submit(analyze_document, args.root, path, args.backend)
+                    except BrokenProcessPool:
+                        # A crashed worker takes the pool down; go on with a fresh one
+                        executor.shutdown(wait=False)
+                        executor = new_executor()
+                        future = executor.submit(analyze_document, args.root, path, args.backend)
+                    pending[future] = path
+                if not pending:
+                    break
+
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    path = pending.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        # The worker died or could not return the record
+                        record = {'path': path, 'clauses': [], 'status': 'error',
+                                  'error': f"{type(e).__name__}: {str(e)}"}
+                    writer.write(record)
+                    documents += 1
+                    clauses += len(record['clauses'])
+                    failures += record['status'] != 'success'
+
+                now = time.perf_counter()
+                if now - last_report >= args.progress_interval:
+                    report()
+                    last_report = now
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    except KeyboardInterrupt:
+        print('Interrupted; rerun with --resume to continue', file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+
+    report(final=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
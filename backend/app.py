@@ -1,13 +1,31 @@
-from flask import Flask, request, jsonify
+import json
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 import logging
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import time
 import traceback
-from utils.document_parser import parse_document
-from utils.chunker import split_into_clauses
-from models.classify_llm import classify_clause
+import uuid
+from models.backends import CLASSIFIER_BACKEND, analysis_version, get_backend
+from models.rule_pack import RULE_PACK_PATH, active_rules, reload_rules
+from utils.pipeline import iter_process_file
+from utils.upload_analysis import analyze_ingested_upload, shape_analysis, store_analysis
+from utils.analysis_cache import AnalysisCache
+from utils.ingest import IN_MEMORY_MAX_SIZE, IngestedUpload, sweep_spilled_uploads
+from utils.jobs import JobManager
+from utils.batch import BatchError, collect_items, run_batch
+from utils.clause_memo import CLAUSE_MEMO
+from utils.response_encoding import (
+    JSON_MIMETYPE, available_encodings, available_mimetypes, compress_body, decode_cursor, encode_body,
+    encode_cursor, parse_options
+)
+from utils.metrics import BYTES_INGESTED, DOCUMENTS, REGISTRY, RESULT_BYTES
+from settings import (
+    ANALYSIS_CACHE_SIZE, ANALYSIS_STORE, BATCH_MAX_CONTENT_LENGTH, JOB_QUEUE_LIMIT, JOB_WORKERS,
+    MAX_CONTENT_LENGTH, NEAR_DUPLICATES, STREAM_MAX_CONTENT_LENGTH, UPLOAD_FOLDER, allowed_file
+)
 
 # Configure logging
 logging.basicConfig(
@@ -16,84 +34,169 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+api = Blueprint('api', __name__)
 
-# Configure CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000"],
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type"]
-    }
-})
+def create_app(config=None):
+    """
+    Application factory. Only builds the app and its services; heavy
+    dependencies are imported lazily or once by utils.startup.preload.
+    """
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    app.config['STREAM_MAX_CONTENT_LENGTH'] = STREAM_MAX_CONTENT_LENGTH
+    app.config['BATCH_MAX_CONTENT_LENGTH'] = BATCH_MAX_CONTENT_LENGTH
+    app.config['UPLOAD_IN_MEMORY_MAX_SIZE'] = IN_MEMORY_MAX_SIZE
+    app.config['ANALYSIS_CACHE_SIZE'] = ANALYSIS_CACHE_SIZE
+    app.config['JOB_WORKERS'] = JOB_WORKERS
+    app.config['JOB_QUEUE_LIMIT'] = JOB_QUEUE_LIMIT
+    app.config['NEAR_DUPLICATES'] = NEAR_DUPLICATES
+    app.config['ANALYSIS_STORE'] = ANALYSIS_STORE
+    if config:
+        app.config.update(config)
 
-# Configure upload settings
-UPLOAD_FOLDER = 'uploads'
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
+    # Configure CORS
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000"],
+            "methods": ["GET", "POST", "OPTIONS"],
+            "allow_headers": ["Content-Type"]
+        }
+    })
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    # Create uploads directory if it doesn't exist
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    sweep_spilled_uploads(upload_folder)
 
-# Create uploads directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # Results keyed by content hash + ruleset version, persisted under the upload folder
+    app.extensions['analysis_cache'] = AnalysisCache(
+        db_path=os.path.join(upload_folder, 'analysis_cache.sqlite3'),
+        max_entries=app.config['ANALYSIS_CACHE_SIZE']
+    )
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    # Background analysis jobs; state lives in SQLite so any HTTP worker can report it
+    app.extensions['job_manager'] = JobManager(
+        db_path=os.path.join(upload_folder, 'jobs.sqlite3'),
+        max_workers=app.config['JOB_WORKERS'],
+        max_pending=app.config['JOB_QUEUE_LIMIT']
+    )
 
-def process_file(file_path):
-    """Process the uploaded file and return analysis results"""
-    try:
-        # Extract text from document
-        logger.info('Extracting text from document')
-        text = parse_document(file_path)
-        logger.info(f"Text extracted successfully from {file_path}")
-        
-        # Split into clauses
-        logger.info('Splitting text into clauses')
-        clauses = split_into_clauses(text)
-        logger.info(f"Text split into {len(clauses)} clauses")
-        
-        # Classify each clause
-        results = []
-        for i, clause in enumerate(clauses, 1):
-            try:
-                logger.info(f'Classifying clause {i}/{len(clauses)}')
-                classification = classify_clause(clause)
-                results.append({
-                    'text': clause,
-                    'type': classification['type'],
-                    'risk_level': classification['risk_level'],
-                    'explanation': classification['explanation'],
-                    'specific_concerns': classification['specific_concerns']
-                })
-                logger.info(f"Clause {i}/{len(clauses)} classified successfully")
-            except Exception as e:
-                logger.error(f"Error classifying clause {i}: {str(e)}")
-                results.append({
-                    'text': clause,
-                    'type': 'Error',
-                    'risk_level': 'Unknown',
-                    'explanation': f'Error in classification: {str(e)}',
-                    'specific_concerns': ['Error occurred during classification']
-                })
-        
-        return {
-            'status': 'success',
-            'message': 'File processed successfully',
-            'clauses': results
-        }
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-        logger.error(traceback.format_exc())
-        return {
-            'status': 'error',
-            'message': f'Error processing file: {str(e)}',
-            'clauses': []
-        }
+    app.register_blueprint(api)
+    return app
+
+def analysis_cache() -> AnalysisCache:
+    return current_app.extensions['analysis_cache']
+
+def job_manager() -> JobManager:
+    return current_app.extensions['job_manager']
+
+def near_duplicate_index():
+    """
+    The clause near-duplicate index, opened on first use so that numpy is
+    not imported until it is needed. None when the feature is disabled.
+    """
+    if not current_app.config['NEAR_DUPLICATES']:
+        return None
+    index = current_app.extensions.get('near_duplicates')
+    if index is None:
+        from utils.near_duplicates import NearDuplicateIndex
+        index = current_app.extensions['near_duplicates'] = NearDuplicateIndex(
+            os.path.join(current_app.config['UPLOAD_FOLDER'], 'near_duplicates.sqlite3')
+        )
+    return index
+
+def analysis_store():
+    """
+    The searchable store of analysed documents, opened on first use. None
+    when the feature is disabled.
+    """
+    if not current_app.config['ANALYSIS_STORE']:
+        return None
+    store = current_app.extensions.get('analysis_store')
+    if store is None:
+        from utils.analysis_store import AnalysisStore
+        store = current_app.extensions['analysis_store'] = AnalysisStore(
+            os.path.join(current_app.config['UPLOAD_FOLDER'], 'analysis_store.sqlite3')
+        )
+    return store
+
+def encoded_response(payload, status=200):
+    """
+    Serialize a payload as JSON or MessagePack and compress it with brotli
+    or gzip, whichever the client accepts
+    """
+    mimetype = request.accept_mimetypes.best_match(available_mimetypes(), default=JSON_MIMETYPE)
+    body = encode_body(payload, mimetype)
+    body, coding = compress_body(body, request.accept_encodings.best_match(available_encodings()))
+    response = Response(body, status=status, mimetype=mimetype)
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+def analysis_response(result, options, filename, document_key, index_document):
+    """
+    Respond with an analysis shaped by the client's options (see
+    utils.upload_analysis.shape_analysis)
+    """
+    payload = shape_analysis(result, options, near_duplicate_index(), filename, document_key, index_document)
+    response = encoded_response(payload)
+    RESULT_BYTES.observe(response.content_length or 0)
+    return response
+
+def get_uploaded_file():
+    """
+    Return (file, None) for a valid upload or (None, error_response)
+    """
+    if 'file' not in request.files:
+        logger.error("No file part in request")
+        return None, (jsonify({'error': 'No file part'}), 400)
+
+    file = request.files['file']
+    logger.info(f"Received file: {file.filename}")
 
-@app.route('/api/upload', methods=['POST', 'OPTIONS'])
+    if file.filename == '':
+        logger.error("No selected file")
+        return None, (jsonify({'error': 'No selected file'}), 400)
+
+    if not allowed_file(file.filename):
+        logger.error(f"Invalid file type: {file.filename}")
+        return None, (jsonify({'error': 'Invalid file type'}), 400)
+
+    return file, None
+
+def ingest_upload(file) -> IngestedUpload:
+    """
+    Read an uploaded file once: parsed from memory when small, otherwise
+    spilled to a uniquely named file in the upload folder
+    """
+    upload = IngestedUpload(
+        file.stream, file.filename, current_app.config['UPLOAD_FOLDER'],
+        in_memory_max_size=current_app.config['UPLOAD_IN_MEMORY_MAX_SIZE']
+    )
+    BYTES_INGESTED.inc(upload.size)
+    return upload
+
+@api.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(error):
+    limit = request.max_content_length
+    logger.error(f"Rejected upload larger than {limit} bytes")
+    return jsonify({'error': f'File too large (limit {limit} bytes)'}), 413
+
+@api.route('/api/upload', methods=['POST', 'OPTIONS'])
 def upload_file():
+    """
+    Analyse one document. The response's ``analysis_id`` identifies the
+    result; send it back as ``previous_analysis_id`` with a revised version
+    of the document to have only its inserted and modified clauses
+    classified and every clause flagged with its change.
+
+    Query parameters shape the response: ``format=compact`` interns the
+    repeated clause fields into lookup tables, ``fields`` keeps only the
+    listed clause fields, and ``limit``/``cursor`` page through the
+    clauses (later pages come from /api/analyses/<analysis_id>).
+    """
     if request.method == 'OPTIONS':
         return '', 200
 
@@ -101,47 +204,289 @@ def upload_file():
     logger.info("Upload request received")
     
     try:
-        if 'file' not in request.files:
-            logger.error("No file part in request")
-            return jsonify({'error': 'No file part'}), 400
-        
-        file = request.files['file']
-        logger.info(f"Received file: {file.filename}")
-        
-        if file.filename == '':
-            logger.error("No selected file")
-            return jsonify({'error': 'No selected file'}), 400
-        
-        if not allowed_file(file.filename):
-            logger.error(f"Invalid file type: {file.filename}")
-            return jsonify({'error': 'Invalid file type'}), 400
-        
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        logger.info(f"Saving file to: {file_path}")
-        file.save(file_path)
-        logger.info("File saved successfully")
+        file, error = get_uploaded_file()
+        if error:
+            return error
+
+        try:
+            options = parse_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        previous_id = request.form.get('previous_analysis_id') or request.args.get('previous_analysis_id')
+        previous = None
+        if previous_id:
+            previous = analysis_cache().get(previous_id)
+            if previous is None:
+                logger.error(f"Previous analysis not found: {previous_id}")
+                return jsonify({'error': 'Previous analysis not found'}), 404
         
-        # Process the file
-        logger.info("Starting file processing")
-        result = process_file(file_path)
-        logger.info(f"File processing completed: {result}")
+        with ingest_upload(file) as upload:
+            payload, cache_hit = analyze_ingested_upload(
+                upload, options, analysis_cache(), analysis_store(), near_duplicate_index(),
+                previous_id, previous
+            )
         
         end_time = time.time()
         logger.info(f"Total processing time: {end_time - start_time:.2f} seconds")
         
-        return jsonify(result)
+        response = encoded_response(payload)
+        RESULT_BYTES.observe(response.content_length or 0)
+        response.headers['X-Analysis-Cache'] = 'hit' if cache_hit else 'miss'
+        return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload_file: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/analyses/<analysis_id>', methods=['GET'])
+def get_analysis(analysis_id):
+    """
+    A stored analysis by the analysis_id of its upload, shaped with the
+    same query parameters as /api/upload; this is where clients fetch the
+    pages after the first
+    """
+    try:
+        options = parse_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = analysis_cache().get(analysis_id)
+    if result is None:
+        return jsonify({'error': 'Analysis not found'}), 404
+    document_key = analysis_id.split(':', 1)[0]
+    return analysis_response(dict(result, analysis_id=analysis_id), options, None, document_key, False)
+
+@api.route('/api/search', methods=['GET'])
+def search_clauses():
+    """
+    Search the clauses of every stored analysis, newest first. ``q`` is
+    full text; ``type``, ``risk_level``, ``document`` (part of the file
+    name), ``since`` and ``until`` (ISO dates) filter; ``limit`` and
+    ``cursor`` page through the results.
+    """
+    from utils.analysis_store import MAX_SEARCH_LIMIT, parse_time
+    store = analysis_store()
+    if store is None:
+        return jsonify({'error': 'Analysis store is disabled'}), 404
+
+    args = request.args
+    try:
+        limit = int(args.get('limit', 50))
+        if not 0 < limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+        found = store.search(
+            query=args.get('q'),
+            clause_type=args.get('type'),
+            risk_level=args.get('risk_level'),
+            document=args.get('document'),
+            since=parse_time(args['since']) if args.get('since') else None,
+            until=parse_time(args['until']) if args.get('until') else None,
+            limit=limit,
+            before_id=decode_cursor(args['cursor']) if args.get('cursor') else None,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    next_id = found['next_before_id']
+    response = encoded_response({
+        'clauses': found['clauses'],
+        'next_cursor': encode_cursor(next_id) if next_id is not None else None,
+    })
+    RESULT_BYTES.observe(response.content_length or 0)
+    return response
+
+@api.route('/api/upload/batch', methods=['POST', 'OPTIONS'])
+def upload_batch():
+    """
+    Analyse many documents in one request. Accepts several 'files' parts
+    and/or ZIP archives; documents are processed concurrently on the job
+    pool and failures are reported per document.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    # A batch may be much larger than a single upload
+    request.max_content_length = current_app.config['BATCH_MAX_CONTENT_LENGTH']
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        logger.error("No files in batch request")
+        return jsonify({'error': 'No files'}), 400
+
+    try:
+        items = collect_items(files, allowed_file)
+    except BatchError as e:
+        logger.error(f"Rejected batch: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+    BYTES_INGESTED.inc(sum(len(item.content) for item in items))
+    work_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], f"batch_{uuid.uuid4().hex}")
+    try:
+        result = run_batch(items, work_dir, job_manager().executor,
+                           cache=analysis_cache(), ruleset_version=analysis_version())
+    except Exception as e:
+        logger.error(f"Error in upload_batch: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+    for document in result['documents']:
+        DOCUMENTS.inc(endpoint='batch', cache='hit' if document['cached'] else 'miss')
+        store_analysis(analysis_store(), document['analysis_id'], document['filename'], document)
+    response = jsonify(result)
+    RESULT_BYTES.observe(response.content_length or 0)
+    return response
+
+def format_stream_event(event, sse=False):
+    """Serialize a pipeline event as an NDJSON line or a Server-Sent Event"""
+    data = json.dumps(event)
+    if sse:
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + '\n'
+
+@api.route('/api/upload/stream', methods=['POST', 'OPTIONS'])
+def upload_file_stream():
+    """
+    Streaming variant of /api/upload. Emits document metadata, one record per
+    clause as soon as it is classified and a summary trailer, as NDJSON or as
+    Server-Sent Events when the client accepts text/event-stream.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    # Results are streamed, so this endpoint may accept larger documents
+    request.max_content_length = current_app.config['STREAM_MAX_CONTENT_LENGTH']
+    file, error = get_uploaded_file()
+    if error:
+        return error
+
+    upload = ingest_upload(file)
+    DOCUMENTS.inc(endpoint='stream', cache='none')
+    logger.info(f"Streaming analysis of {file.filename}")
+
+    sse = request.accept_mimetypes.best_match(
+        ['application/x-ndjson', 'text/event-stream']
+    ) == 'text/event-stream'
+
+    def generate():
+        try:
+            for event in iter_process_file(upload.source):
+                yield format_stream_event(event, sse=sse)
+        finally:
+            upload.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also covers responses that are never iterated
+    response.call_on_close(upload.close)
+    return response
+
+@api.route('/api/jobs', methods=['POST', 'OPTIONS'])
+def create_job():
+    """
+    Queue an upload for background analysis and return its job id at once
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    file, error = get_uploaded_file()
+    if error:
+        return error
+
+    if job_manager().is_full():
+        logger.error("Job queue is full")
+        return jsonify({'error': 'Too many pending jobs, try again later'}), 503
+
+    # Jobs run after the request returns, so each one gets its own file
+    job_id = uuid.uuid4().hex
+    filename = secure_filename(file.filename)
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+    file.save(file_path)
+    BYTES_INGESTED.inc(os.path.getsize(file_path))
+    DOCUMENTS.inc(endpoint='jobs', cache='none')
+
+    job_manager().submit(file_path, file.filename, job_id=job_id)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@api.route('/api/cache', methods=['GET'])
+def cache_stats():
+    stats = analysis_cache().stats()
+    stats['ruleset_version'] = active_rules().ruleset_version
+    stats['classifier_backend'] = CLASSIFIER_BACKEND
+    stats['clause_memo'] = CLAUSE_MEMO.stats()
+    store = analysis_store()
+    if store is not None:
+        stats['analysis_store'] = store.stats()
+    return jsonify(stats), 200
+
+@api.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """
+    Drop cached analyses. Send {"stale_only": true} to keep results produced
+    by the current ruleset and backend and only remove all others.
+    """
+    payload = request.get_json(silent=True) or {}
+    keep_version = analysis_version() if payload.get('stale_only') else None
+    removed = analysis_cache().invalidate(keep_version=keep_version)
+    return jsonify({'status': 'success', 'removed': removed}), 200
+
+@api.route('/api/classifier', methods=['GET'])
+def classifier_stats():
+    """Active classifier backend and, for batching backends, its throughput"""
+    backend = get_backend()
+    stats = backend.stats() if hasattr(backend, 'stats') else {}
+    return jsonify({'backend': backend.name, 'stats': stats}), 200
+
+@api.route('/api/rules', methods=['GET'])
+def rule_pack():
+    """The active rule pack"""
+    return jsonify(dict(active_rules().describe(), path=RULE_PACK_PATH)), 200
+
+@api.route('/api/rules/reload', methods=['POST'])
+def reload_rule_pack():
+    """
+    Reload the rule pack now instead of waiting for the file check. A pack
+    that does not load keeps the current one active.
+    """
+    previous = active_rules()
+    rules = reload_rules(force=True)
+    return jsonify({
+        'status': 'success',
+        'previous': previous.version_tag,
+        'changed': rules.ruleset_version != previous.ruleset_version,
+        'active': rules.describe(),
+    }), 200
+
+@api.route('/api/parsers', methods=['GET'])
+def parser_stats():
+    """Registered parser engines, the active policy and each engine's throughput"""
+    from utils.parser_engines import PARSER_POLICY, engine_stats
+    return jsonify({'policy': PARSER_POLICY, 'engines': engine_stats()}), 200
+
+@api.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics for this worker process"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'}), 200
 
 if __name__ == '__main__':
     logger.info('Starting Flask application')
-    app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+ASGI serving variant of /api/upload and /api/health.
+
+The pipeline is synchronous, so every upload is read, analysed, encoded and
+compressed on a bounded thread pool and the event loop only moves bytes.
+Once ASGI_MAX_PENDING uploads are queued or running in a worker, further
+ones get a 503 straight away instead of piling up. Responses are the same
+as the Flask routes', including the query options and revision mode.
+
+In production run it under gunicorn with uvicorn workers, which preloads
+the rule pack and heavy modules once in the master before forking:
+
+    SERVER=asgi gunicorn -c gunicorn.conf.py
+
+`python asgi.py` serves a single process for development.
+"""
+import asyncio
+import logging
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from utils.analysis_cache import AnalysisCache
+from utils.ingest import IN_MEMORY_MAX_SIZE, IngestedUpload, sweep_spilled_uploads
+from utils.metrics import BYTES_INGESTED, RESULT_BYTES
+from utils.response_encoding import (
+    JSON_MIMETYPE, available_encodings, available_mimetypes, compress_body, encode_body, parse_options
+)
+from utils.upload_analysis import analyze_ingested_upload
+from settings import (
+    ANALYSIS_CACHE_SIZE, ANALYSIS_STORE, MAX_CONTENT_LENGTH, NEAR_DUPLICATES, UPLOAD_FOLDER, allowed_file
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Uploads analysed at once per worker process. Parsing and classification
+# mostly hold the GIL, so throughput comes from worker processes and a few
+# threads are enough to keep I/O and SQLite waits overlapped.
+EXECUTOR_THREADS = int(os.environ.get('ASGI_EXECUTOR_THREADS', min(4, os.cpu_count() or 1)))
+
+# Uploads queued or running per worker process before new ones get a 503
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', 32))
+
+
+class Services:
+    """
+    Per-process state of the ASGI app: the executor, the cache and stores
+    (opened after the fork, in the lifespan handler) and the number of
+    uploads in flight, which is only touched from the event loop
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        folder = config['UPLOAD_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        sweep_spilled_uploads(folder)
+        self.executor = ThreadPoolExecutor(max_workers=config['ASGI_EXECUTOR_THREADS'],
+                                           thread_name_prefix='analysis')
+        self.cache = AnalysisCache(
+            db_path=os.path.join(folder, 'analysis_cache.sqlite3'),
+            max_entries=config['ANALYSIS_CACHE_SIZE']
+        )
+        self.store = None
+        if config['ANALYSIS_STORE']:
+            from utils.analysis_store import AnalysisStore
+            self.store = AnalysisStore(os.path.join(folder, 'analysis_store.sqlite3'))
+        self.near_duplicates = None
+        if config['NEAR_DUPLICATES']:
+            from utils.near_duplicates import NearDuplicateIndex
+            self.near_duplicates = NearDuplicateIndex(os.path.join(folder, 'near_duplicates.sqlite3'))
+        self.pending = 0
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+class BodyTooLarge(Exception):
+    """The request body went over the upload limit while it was being read"""
+
+
+def limit_body(request: Request, limit: int) -> Request:
+    """
+    The same request with a receive channel that counts body bytes as
+    request.stream() pulls them and raises BodyTooLarge once more than
+    ``limit`` have arrived, so uploads without a Content-Length (chunked)
+    are cut off before they are spooled in full
+    """
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > limit:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+def error_response(message: str, status: int, headers: Optional[Dict] = None) -> JSONResponse:
+    return JSONResponse({'error': message}, status_code=status, headers=headers)
+
+
+def encoded_response(payload, accept: str, accept_encoding: str) -> Response:
+    """
+    Serialize a payload as JSON or MessagePack and compress it with brotli
+    or gzip, negotiated as in the Flask app
+    """
+    mimetype = parse_accept_header(accept, MIMEAccept).best_match(available_mimetypes(), default=JSON_MIMETYPE)
+    body = encode_body(payload, mimetype)
+    coding = parse_accept_header(accept_encoding).best_match(available_encodings())
+    body, coding = compress_body(body, coding)
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if coding:
+        headers['Content-Encoding'] = coding
+    return Response(body, media_type=mimetype, headers=headers)
+
+
+def analyze_upload(services: Services, stream, filename: str, args, previous_id: Optional[str],
+                   accept: str, accept_encoding: str) -> Response:
+    """
+    The blocking part of an upload, run on the executor: ingest, analysis
+    (shared with the Flask app, see utils.upload_analysis) and response
+    encoding
+    """
+    try:
+        options = parse_options(args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    previous = None
+    if previous_id:
+        previous = services.cache.get(previous_id)
+        if previous is None:
+            logger.error(f"Previous analysis not found: {previous_id}")
+            return error_response('Previous analysis not found', 404)
+
+    with IngestedUpload(stream, filename, services.config['UPLOAD_FOLDER'],
+                        in_memory_max_size=services.config['UPLOAD_IN_MEMORY_MAX_SIZE']) as upload:
+        BYTES_INGESTED.inc(upload.size)
+        payload, cache_hit = analyze_ingested_upload(
+            upload, options, services.cache, services.store, services.near_duplicates, previous_id, previous
+        )
+
+    response = encoded_response(payload, accept, accept_encoding)
+    response.headers['X-Analysis-Cache'] = 'hit' if cache_hit else 'miss'
+    RESULT_BYTES.observe(len(response.body))
+    return response
+
+
+async def upload_file(request: Request) -> Response:
+    services: Services = request.app.state.services
+    length = request.headers.get('content-length')
+    limit = services.config['MAX_CONTENT_LENGTH']
+    if length and length.isdigit() and int(length) > limit:
+        logger.error(f"Rejected upload larger than {limit} bytes")
+        return error_response(f'File too large (limit {limit} bytes)', 413)
+    if services.pending >= services.config['ASGI_MAX_PENDING']:
+        logger.warning(f"Turning away upload: {services.pending} already pending")
+        return error_response('Server busy, retry later', 503, {'Retry-After': '1'})
+
+    services.pending += 1
+    form = None
+    try:
+        form = await limit_body(request, limit).form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            logger.error("No file part in request")
+            return error_response('No file part', 400)
+        logger.info(f"Received file: {file.filename}")
+        if not file.filename:
+            logger.error("No selected file")
+            return error_response('No selected file', 400)
+        if not allowed_file(file.filename):
+            logger.error(f"Invalid file type: {file.filename}")
+            return error_response('Invalid file type', 400)
+
+        previous_id = form.get('previous_analysis_id') or request.query_params.get('previous_analysis_id')
+        return await asyncio.get_running_loop().run_in_executor(
+            services.executor, analyze_upload, services, file.file, file.filename, request.query_params,
+            previous_id, request.headers.get('accept', ''), request.headers.get('accept-encoding', '')
+        )
+    except BodyTooLarge:
+        logger.error(f"Rejected upload larger than {limit} bytes")
+        return error_response(f'File too large (limit {limit} bytes)', 413)
+    except Exception as e:
+        logger.error(f"Error in upload_file: {str(e)}")
+        logger.error(traceback.format_exc())
+        return error_response(str(e), 500)
+    finally:
+        services.pending -= 1
+        if form is not None:
+            await form.close()
+
+
+async def health_check(request: Request) -> Response:
+    return JSONResponse({'status': 'healthy'})
+
+
+def create_asgi_app(config: Optional[Dict] = None) -> Starlette:
+    """
+    Build the ASGI app. Its executor, cache and stores are created by the
+    lifespan handler, i.e. in each worker after the fork.
+    """
+    settings = {
+        'UPLOAD_FOLDER': UPLOAD_FOLDER,
+        'MAX_CONTENT_LENGTH': MAX_CONTENT_LENGTH,
+        'UPLOAD_IN_MEMORY_MAX_SIZE': IN_MEMORY_MAX_SIZE,
+        'ANALYSIS_CACHE_SIZE': ANALYSIS_CACHE_SIZE,
+        'ANALYSIS_STORE': ANALYSIS_STORE,
+        'NEAR_DUPLICATES': NEAR_DUPLICATES,
+        'ASGI_EXECUTOR_THREADS': EXECUTOR_THREADS,
+        'ASGI_MAX_PENDING': MAX_PENDING,
+    }
+    settings.update(config or {})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.services = Services(settings)
+        try:
+            yield
+        finally:
+            app.state.services.close()
+
+    return Starlette(
+        routes=[
+            Route('/api/upload', upload_file, methods=['POST']),
+            Route('/api/health', health_check, methods=['GET']),
+        ],
+        middleware=[
+            # Same policy as the Flask app
+            Middleware(CORSMiddleware, allow_origins=['http://localhost:3000'],
+                       allow_methods=['GET', 'POST', 'OPTIONS'], allow_headers=['Content-Type']),
+        ],
+        lifespan=lifespan,
+    )
+
+
+if __name__ == '__main__':
+    import uvicorn
+    from utils.startup import preload
+
+    preload()
+    logger.info('Starting ASGI application')
+    uvicorn.run(create_asgi_app(), host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
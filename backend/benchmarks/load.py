@@ -0,0 +1,211 @@
+"""
+Load generator for a running server (Flask under gunicorn, or the ASGI
+variant). Uploads the sample PDFs from backend/uploads/ at a fixed
+concurrency and reports latency percentiles and requests per second.
+Standard library only.
+
+Run from the backend directory, e.g.:
+
+    python -m benchmarks.load --url http://localhost:5001 --concurrency 1,8,32 --requests 200
+    python -m benchmarks.load --duration 30 --unique --output load.json
+
+Identical uploads are answered from the analysis cache after the first
+one; --unique makes every request a different document (a comment is
+appended after the PDF's end marker) so that each one is analysed.
+"""
+import argparse
+import glob
+import http.client
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_FILES = os.path.join(BACKEND_DIR, 'uploads', '*.pdf')
+
+
+def multipart_body(filename: str, content: bytes) -> Tuple[bytes, str]:
+    """A multipart/form-data body with one 'file' part and its content type"""
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode('ascii'),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode('utf-8'),
+        b'Content-Type: application/octet-stream\r\n\r\n',
+        content,
+        f'\r\n--{boundary}--\r\n'.encode('ascii'),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadRun:
+    """
+    One run at a fixed concurrency: every thread keeps its own keep-alive
+    connection and sends uploads back to back until the request budget or
+    the deadline is used up
+    """
+
+    def __init__(self, url: str, documents: List[Tuple[str, bytes]], concurrency: int,
+                 requests: Optional[int], duration: Optional[float], unique: bool, timeout: float):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.path = (parsed.path.rstrip('/') or '') + '/api/upload'
+        self.documents = documents
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.unique = unique
+        self.timeout = timeout
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def _next(self, deadline: Optional[float]) -> Optional[int]:
+        number = next(self._counter)
+        if self.requests is not None and number >= self.requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        return number
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _worker(self, deadline: Optional[float]) -> None:
+        connection = self._connect()
+        try:
+            while True:
+                number = self._next(deadline)
+                if number is None:
+                    return
+                filename, content = self.documents[number % len(self.documents)]
+                if self.unique:
+                    content = content + f'\n% load {uuid.uuid4().hex}\n'.encode('ascii')
+                body, content_type = multipart_body(filename, content)
+                started = time.perf_counter()
+                try:
+                    connection.request('POST', self.path, body=body, headers={'Content-Type': content_type})
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException) as e:
+                    with self._lock:
+                        self.errors[type(e).__name__] += 1
+                    connection.close()
+                    connection = self._connect()
+                    continue
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.statuses[status] += 1
+                    if status == 200:
+                        self.latencies.append(elapsed)
+        finally:
+            connection.close()
+
+    def run(self) -> Dict:
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(self._worker, deadline) for _ in range(self.concurrency)]:
+                future.result()
+        wall = time.perf_counter() - started
+
+        latencies = sorted(self.latencies)
+        completed = sum(self.statuses.values())
+        return {
+            'concurrency': self.concurrency,
+            'requests': completed,
+            'ok': len(latencies),
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'errors': dict(self.errors),
+            'seconds': wall,
+            'requests_per_second': completed / wall if wall else 0.0,
+            # Rejections (e.g. 503 from a full queue) are cheap, so count successes apart
+            'ok_per_second': len(latencies) / wall if wall else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test /api/upload with the sample PDFs')
+    parser.add_argument('--url', default='http://localhost:5001', help='server base URL')
+    parser.add_argument('--concurrency', type=lambda v: [int(x) for x in v.split(',')], default=[1, 8, 32],
+                        help='comma-separated concurrency levels, one run each')
+    parser.add_argument('--requests', type=int, default=200, help='requests per run')
+    parser.add_argument('--duration', type=float,
+                        help='seconds per run; overrides --requests')
+    parser.add_argument('--files', default=DEFAULT_FILES, help='glob of documents to upload')
+    parser.add_argument('--unique', action='store_true',
+                        help='make every upload a distinct document so none is served from the cache')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests before the first run')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request timeout in seconds')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    paths = sorted(glob.glob(args.files))
+    if not paths:
+        print(f"No documents match {args.files}", file=sys.stderr)
+        return 2
+    documents = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            documents.append((os.path.basename(path), file.read()))
+
+    if args.warmup:
+        LoadRun(args.url, documents, 1, args.warmup, None, args.unique, args.timeout).run()
+
+    runs = []
+    for concurrency in args.concurrency:
+        requests = None if args.duration else args.requests
+        result = LoadRun(args.url, documents, concurrency, requests, args.duration, args.unique, args.timeout).run()
+        runs.append(result)
+        print(f"c={concurrency:<4} {result['requests']:6} req {result['requests_per_second']:8.1f} req/s {result['ok_per_second']:8.1f} ok/s  "
+              f"p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+              f"non-200 {result['requests'] - result['ok']}  errors {sum(result['errors'].values())}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'url': args.url,
+                    'files': [os.path.basename(path) for path in paths],
+                    'unique': args.unique,
+                },
+                'runs': runs,
+            }, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""
+End-to-end benchmarks for the analysis pipeline.
+
+Run from the backend directory, e.g.:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.15
+
+Every case times parse_document, split_into_clauses, classify_clause,
+RuleBasedClassifier.analyze_contract and the full /api/upload request
+separately. Results are written as JSON; with --baseline each median is
+compared against the stored run and the exit status is 1 when any stage
+is slower than the threshold allows.
+"""
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic import WRITERS, generate_contract  # noqa: E402
+
+SAMPLE_GLOBS = [
+    os.path.join(BACKEND_DIR, 'uploads', '*.pdf'),
+    os.path.join(BACKEND_DIR, 'data', 'uploads', '*.pdf'),
+]
+
+
+def measure(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> Dict:
+    """
+    Time ``func`` ``repeat`` times and summarise the wall-clock seconds.
+    ``setup`` runs untimed before every repeat.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'repeat': repeat,
+    }
+
+
+def bench_document(path: str, repeat: int, client=None, app=None) -> Dict:
+    """
+    Time each pipeline stage on one document
+    """
+    from utils.document_parser import parse_document
+    from utils.chunker import split_into_clauses
+    from utils.classifier import RuleBasedClassifier
+    from models.classify_llm import classify_clause
+    from utils.clause_memo import CLAUSE_MEMO
+
+    text = parse_document(path)
+    clauses = split_into_clauses(text)
+    classifier = RuleBasedClassifier()
+
+    result = {
+        'file': os.path.basename(path),
+        'bytes': os.path.getsize(path),
+        'characters': len(text),
+        'clauses': len(clauses),
+        'stages': {
+            'parse_document': measure(lambda: parse_document(path), repeat),
+            'split_into_clauses': measure(lambda: split_into_clauses(text), repeat),
+            # Every repeat classifies from scratch rather than from the clause memo
+            'classify_clause': measure(lambda: [classify_clause(c) for c in clauses], repeat,
+                                       setup=CLAUSE_MEMO.clear),
+            'rule_based_analyze_contract': measure(lambda: classifier.analyze_contract(clauses), repeat,
+                                                   setup=CLAUSE_MEMO.clear),
+        },
+    }
+
+    if client is not None:
+        with open(path, 'rb') as file:
+            content = file.read()
+        name = os.path.basename(path)
+
+        def cold():
+            # Measure the cold path, not the analysis cache or the clause memo
+            app.extensions['analysis_cache'].invalidate()
+            CLAUSE_MEMO.clear()
+
+        def upload():
+            response = client.post('/api/upload', data={'file': (io.BytesIO(content), name)})
+            assert response.status_code == 200, response.data
+
+        result['stages']['api_upload'] = measure(upload, repeat, setup=cold)
+    return result
+
+
+def bench_pipeline(args, workdir: str) -> Dict:
+    """
+    Synthetic contracts of each size and format, plus the bundled samples
+    """
+    client = app = None
+    if not args.skip_api:
+        from app import create_app
+        app = create_app({'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'), 'TESTING': True})
+        client = app.test_client()
+
+    cases = {}
+    for count in args.clauses:
+        text = generate_contract(count, args.words, args.density, seed=count)
+        for fmt in args.formats:
+            path = WRITERS[fmt](text, os.path.join(workdir, f'synthetic_{count}.{fmt}'))
+            cases[f'synthetic/{fmt}/{count}'] = bench_document(path, args.repeat, client, app)
+
+    if not args.skip_samples:
+        for pattern in SAMPLE_GLOBS:
+            for path in sorted(glob.glob(pattern)):
+                name = os.path.relpath(path, BACKEND_DIR)
+                cases[f'sample/{name}'] = bench_document(path, args.repeat, client, app)
+    return cases
+
+
+def bench_backends(args, workdir: str) -> Dict:
+    """
+    Every classifier backend on the same synthetic clauses
+    """
+    from models.backends import BACKENDS, get_backend
+    from benchmarks.synthetic import generate_clauses
+    from utils.clause_memo import CLAUSE_MEMO
+
+    cases = {}
+    for count in args.clauses:
+        clauses = generate_clauses(count, args.words, args.density, seed=count)
+        stages = {}
+        for name in sorted(BACKENDS):
+            try:
+                backend = get_backend(name)
+            except (ImportError, ValueError) as e:
+                print(f"Skipping backend {name}: {str(e)}", file=sys.stderr)
+                continue
+            stages[name] = measure(lambda: backend.classify_ids(clauses), args.repeat, setup=CLAUSE_MEMO.clear)
+        cases[f'synthetic/{count}'] = {'clauses': count, 'stages': stages}
+    return cases
+
+
+def bench_near_duplicates(args, workdir: str) -> Dict:
+    """
+    Build a near-duplicate index from synthetic clauses, then look up
+    copies of some of them with one word changed
+    """
+    import random
+    from utils.near_duplicates import NearDuplicateIndex
+    from benchmarks.synthetic import generate_clauses
+
+    cases = {}
+    for count in args.clauses:
+        clauses = generate_clauses(count, args.words, args.density, seed=count)
+        rng = random.Random(count)
+        queries = []
+        for clause in rng.sample(clauses, min(100, count)):
+            words = clause.split()
+            words[rng.randrange(len(words))] = 'amended'
+            queries.append(' '.join(words))
+
+        index = NearDuplicateIndex(os.path.join(workdir, f'near_duplicates_{count}.sqlite3'))
+        build = measure(lambda: index.add('synthetic', 'synthetic', clauses), 1)
+        lookup = measure(lambda: index.query_many(queries), args.repeat)
+        found = sum(1 for matches in index.query_many(queries) if matches)
+        stats = index.stats()
+        cases[f'synthetic/{count}'] = {
+            'clauses': count,
+            'stages': {'build': build, 'lookup': lookup},
+            'lookup_ms_per_clause': lookup['median'] * 1000 / len(queries),
+            'bytes_per_clause': stats['bytes_per_clause'],
+            'recall': found / len(queries),
+        }
+    return cases
+
+
+def bench_parsers(args, workdir: str) -> Dict:
+    """
+    Every parser engine, on its own without fallback, on the synthetic
+    documents and the bundled sample PDFs
+    """
+    from utils.parser_engines import ENGINES, PageExtractor
+
+    paths = []
+    for count in args.clauses:
+        text = generate_contract(count, args.words, args.density, seed=count)
+        for fmt in args.formats:
+            paths.append(WRITERS[fmt](text, os.path.join(workdir, f'parsers_{count}.{fmt}')))
+    if not args.skip_samples:
+        for pattern in SAMPLE_GLOBS:
+            paths.extend(sorted(glob.glob(pattern)))
+
+    def extract_all(path, engine):
+        with PageExtractor(lambda: open(path, 'rb'), engine.format) as extractor:
+            extractor.engines = [engine]
+            return [extractor.extract(n)[0] for n in range(extractor.page_count())]
+
+    cases = {}
+    for path in paths:
+        fmt = os.path.splitext(path)[1].lstrip('.')
+        stages = {}
+        for engine in ENGINES.get(fmt, []):
+            try:
+                pages = extract_all(path, engine)
+            except Exception as e:
+                print(f"Skipping engine {engine.name} on {path}: {str(e)}", file=sys.stderr)
+                continue
+            timing = measure(lambda: extract_all(path, engine), args.repeat)
+            timing['pages_per_second'] = len(pages) / timing['median'] if timing['median'] else 0.0
+            timing['characters'] = sum(len(page) for page in pages)
+            stages[engine.name] = timing
+        cases[os.path.relpath(path, BACKEND_DIR) if path.startswith(BACKEND_DIR) else os.path.basename(path)] = {
+            'stages': stages
+        }
+    return cases
+
+
+def bench_search(args, workdir: str) -> Dict:
+    """
+    Fill an analysis store with --store-clauses classified clauses, drawn
+    from a pool of distinct synthetic clauses into 2,000-clause documents,
+    then time typical searches: full text, full text with filters,
+    filters only, a deep page and a narrow date range
+    """
+    import random
+    from models.backends import get_backend
+    from models.rule_pack import active_rules
+    from utils.analysis_store import AnalysisStore
+    from benchmarks.synthetic import generate_clauses
+
+    per_document = 2000
+    pool = generate_clauses(min(args.store_clauses, 20000), args.words, args.density, seed=7)
+    rules = active_rules()
+    classified = [
+        {'text': text, 'type': rules.type_names[type_id], 'risk_level': rules.risk_names[risk_id]}
+        for text, (type_id, risk_id) in zip(pool, get_backend('rules').classify_ids(pool))
+    ]
+
+    store = AnalysisStore(os.path.join(workdir, 'analysis_store.sqlite3'))
+    rng = random.Random(7)
+    documents = max(1, args.store_clauses // per_document)
+    started = time.perf_counter()
+    now = time.time()
+    for number in range(documents):
+        clauses = [rng.choice(classified) for _ in range(min(per_document, args.store_clauses))]
+        # Spread the documents over the past year
+        store.add(f'{number:064x}:bench', f'vendor-{number}.pdf' if number % 4 == 0 else f'customer-{number}.pdf',
+                  {'status': 'success', 'clauses': clauses}, analyzed_at=now - (documents - number) * 3600 * 24 * 365 / documents)
+    build = {'median': time.perf_counter() - started, 'min': 0.0, 'max': 0.0, 'repeat': 1}
+    build['min'] = build['max'] = build['median']
+
+    deep = store.search(risk_level='High', limit=500)
+    for _ in range(20):
+        if deep['next_before_id'] is None:
+            break
+        deep = store.search(risk_level='High', limit=500, before_id=deep['next_before_id'])
+    quarter = now - 3600 * 24 * 91
+    queries = {
+        'text': dict(query='indemnification'),
+        'text_common': dict(query='services'),
+        'text_filtered': dict(query='liability', clause_type='liability', risk_level='High'),
+        'filters': dict(clause_type='liability', risk_level='High'),
+        'filters_quarter_vendor': dict(clause_type='liability', risk_level='High', document='vendor', since=quarter),
+        'text_rare_combination': dict(query='arbitration', clause_type='payment', risk_level='Low'),
+        'deep_page': dict(risk_level='High', before_id=deep['clauses'][-1]['id'] if deep['clauses'] else None),
+    }
+    stages = {'build': build}
+    for name, query in queries.items():
+        stages[name] = measure(lambda: store.search(**query), args.repeat)
+        stages[name]['results'] = len(store.search(**query)['clauses'])
+    stats = store.stats()
+    return {
+        f'store/{stats["clauses"]}': {
+            'clauses': stats['clauses'],
+            'bytes_per_clause': stats['bytes'] / stats['clauses'] if stats['clauses'] else 0.0,
+            'stages': stages,
+        }
+    }
+
+
+# Benchmark suites by name; each returns {case name: {'stages': {stage: timing}}}
+SUITES = {
+    'pipeline': bench_pipeline,
+    'backends': bench_backends,
+    'near_duplicates': bench_near_duplicates,
+    'parsers': bench_parsers,
+    'search': bench_search,
+}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Compare stage medians against a baseline run and return every stage
+    whose median grew by more than ``threshold`` (0.1 = 10%)
+    """
+    regressions = []
+    for suite, cases in current['suites'].items():
+        for case, data in cases.items():
+            old_case = baseline.get('suites', {}).get(suite, {}).get(case)
+            if not old_case:
+                continue
+            for stage, timing in data.get('stages', {}).items():
+                old = old_case.get('stages', {}).get(stage)
+                if not old or not old['median']:
+                    continue
+                ratio = timing['median'] / old['median']
+                if ratio > 1 + threshold:
+                    regressions.append({
+                        'suite': suite,
+                        'case': case,
+                        'stage': stage,
+                        'baseline': old['median'],
+                        'current': timing['median'],
+                        'ratio': round(ratio, 3),
+                    })
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the contract analysis pipeline')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help='suite to run (repeatable, default: all)')
+    parser.add_argument('--clauses', type=lambda v: [int(x) for x in v.split(',')], default=[50, 500, 2000],
+                        help='comma-separated clause counts for synthetic contracts')
+    parser.add_argument('--words', type=int, default=40, help='words per synthetic clause')
+    parser.add_argument('--density', type=float, default=0.05, help='fraction of words that are rule keywords')
+    parser.add_argument('--formats', type=lambda v: v.split(','), default=['txt', 'docx', 'pdf'],
+                        help='comma-separated synthetic formats (txt, docx, pdf)')
+    parser.add_argument('--store-clauses', type=int, default=1000000,
+                        help='clauses stored before timing searches (search suite)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed repetitions per stage')
+    parser.add_argument('--skip-samples', action='store_true', help='do not run the bundled sample PDFs')
+    parser.add_argument('--skip-api', action='store_true', help='do not time the /api/upload request')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous JSON result')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown against the baseline (0.10 = 10%%)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.disable(logging.INFO)
+
+    result = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        },
+        'suites': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.suite or sorted(SUITES):
+            result['suites'][name] = SUITES[name](args, workdir)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+    for suite, cases in result['suites'].items():
+        for case, data in cases.items():
+            for stage, timing in data.get('stages', {}).items():
+                print(f"{suite:10} {case:45} {stage:30} {timing['median'] * 1000:10.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(result, baseline, args.threshold)
+        result['regressions'] = regressions
+        for item in regressions:
+            print(f"REGRESSION {item['suite']} {item['case']} {item['stage']}: "
+                  f"{item['baseline'] * 1000:.2f} ms -> {item['current'] * 1000:.2f} ms (x{item['ratio']})")
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(result, file, indent=2)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
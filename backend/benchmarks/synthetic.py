@@ -0,0 +1,125 @@
+import random
+from typing import List, Optional
+
+from models.rule_pack import active_rules
+
+# Neutral vocabulary used between keywords
+FILLER_WORDS = (
+    'the party shall provide services under this agreement in accordance with '
+    'schedule and applicable terms subject to written notice by either side '
+    'including all reasonable efforts to perform obligations within the period '
+    'described herein for the duration of each order'
+).split()
+
+_RULES = active_rules()
+KEYWORDS = sorted({kw for kws in _RULES.clause_keywords.values() for kw in kws}
+                  | {kw for kws in _RULES.risk_indicators.values() for kw in kws})
+
+
+def generate_clauses(clauses: int = 100, words_per_clause: int = 40,
+                     keyword_density: float = 0.05, seed: Optional[int] = 0) -> List[str]:
+    """
+    Generate clause bodies of roughly ``words_per_clause`` words, where each
+    word is a rule keyword with probability ``keyword_density``
+    """
+    rng = random.Random(seed)
+    result = []
+    for _ in range(clauses):
+        words = [
+            rng.choice(KEYWORDS) if rng.random() < keyword_density else rng.choice(FILLER_WORDS)
+            for _ in range(words_per_clause)
+        ]
+        words[0] = words[0].capitalize()
+        result.append(' '.join(words) + '.')
+    return result
+
+
+def generate_contract(clauses: int = 100, words_per_clause: int = 40,
+                      keyword_density: float = 0.05, seed: Optional[int] = 0) -> str:
+    """
+    Generate a numbered contract with the given size and keyword density
+    """
+    bodies = generate_clauses(clauses, words_per_clause, keyword_density, seed)
+    lines = ['MASTER SERVICES AGREEMENT', '', 'THE PARTIES AGREE AS FOLLOWS:', '']
+    lines += [f'{i}. {body}' for i, body in enumerate(bodies, 1)]
+    lines += ['', 'IN WITNESS WHEREOF the parties have signed this agreement.']
+    return '\n'.join(lines)
+
+
+def write_txt(text: str, path: str) -> str:
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    return path
+
+
+def write_docx(text: str, path: str) -> str:
+    import docx
+
+    document = docx.Document()
+    for line in text.split('\n'):
+        document.add_paragraph(line)
+    document.save(path)
+    return path
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f'{line} {word}' if line else word
+        lines.append(line)
+    return lines
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(text: str, path: str, lines_per_page: int = 60, width: int = 95) -> str:
+    """
+    Write ``text`` as a plain multi-page PDF (Helvetica, no dependencies)
+    """
+    lines = _wrap(text, width)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = []  # object bodies, numbered from 1
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append('<< /Type /Catalog /Pages 2 0 R >>')
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {len(pages)} >>")
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    for page_id, page_lines in zip(page_ids, pages):
+        content = 'BT /F1 10 Tf 12 TL 50 790 Td ' + ' '.join(
+            f'({_pdf_escape(line)}) Tj T*' for line in page_lines
+        ) + ' ET'
+        objects.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>'
+        )
+        objects.append(f'<< /Length {len(content.encode("latin-1", errors="replace"))} >>\nstream\n{content}\nendstream')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1', errors='replace')
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+
+    with open(path, 'wb') as file:
+        file.write(output)
+    return path
+
+
+WRITERS = {
+    'txt': write_txt,
+    'docx': write_docx,
+    'pdf': write_pdf,
+}
@@ -1,7 +1,7 @@
-import nltk
- 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('wordnet')
-nltk.download('stopwords') 
\ No newline at end of file
+from utils.chunker import NLTK_DATA_DIR, ensure_nltk_data
+
+# Download required NLTK data into the local bundle used at startup
+missing = ensure_nltk_data(download=True)
+if missing:
+    raise SystemExit(f"Could not download NLTK packages into {NLTK_DATA_DIR}: {', '.join(missing)}")
+print(f"NLTK data ready in {NLTK_DATA_DIR}")
@@ -0,0 +1,24 @@
+import os
+
+# Serve the app built by the factory; with preload_app the master builds it
+# once and the workers are forked from there. app.py has no module-level
+# instance, so importing it does not build a second one. SERVER=asgi
+# serves the ASGI variant (asgi.py) with uvicorn workers instead.
+if os.environ.get('SERVER', 'wsgi') == 'asgi':
+    wsgi_app = 'asgi:create_asgi_app()'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    """
+    Import heavy dependencies, load the compiled rule pack and verify NLTK
+    data before forking workers
+    """
+    from utils.startup import preload
+    preload()
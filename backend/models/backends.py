@@ -0,0 +1,142 @@
+import importlib
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.classify_llm import build_classification, classify_clause, resolve_clause
+from models.rule_pack import RuleSet, active_rules, on_reload
+
+logger = logging.getLogger(__name__)
+
+# Backend used when none is requested explicitly
+CLASSIFIER_BACKEND = os.environ.get('CLASSIFIER_BACKEND', 'rules')
+
+
+class ClassifierBackend:
+    """
+    A clause classifier. Backends only have to map clause texts to
+    (type id, risk id) pairs in the ids of ``rules``, the RuleSet they were
+    built for; the response payload is always built by build_classification
+    so every backend returns the same schema.
+    """
+
+    name = ''
+
+    def __init__(self, rules: Optional[RuleSet] = None):
+        self.rules = rules or active_rules()
+
+    def classify_ids(self, clauses: List[str]) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+    def classify_batch(self, clauses: List[str]) -> List[Dict]:
+        rules = self.rules
+        return [
+            build_classification(rules.type_names[type_id], rules.risk_names[risk_id], clause, rules)
+            for clause, (type_id, risk_id) in zip(clauses, self.classify_ids(clauses))
+        ]
+
+
+class RuleBackend(ClassifierBackend):
+    """
+    Keyword rules from the rule pack, one automaton scan per distinct
+    clause. Without an explicit RuleSet it follows the active one, so rule
+    pack reloads take effect immediately.
+    """
+
+    name = 'rules'
+
+    def __init__(self, rules: Optional[RuleSet] = None):
+        self._rules = rules
+
+    @property
+    def rules(self) -> RuleSet:
+        return self._rules or active_rules()
+
+    def classify_ids(self, clauses: List[str]) -> List[Tuple[int, int]]:
+        rules = self.rules
+        result = []
+        for clause in clauses:
+            clause_type, risk_level = resolve_clause(clause, rules)
+            result.append((rules.type_ids[clause_type], rules.risk_ids[risk_level]))
+        return result
+
+    def classify_batch(self, clauses: List[str]) -> List[Dict]:
+        rules = self.rules
+        return [classify_clause(clause, rules) for clause in clauses]
+
+
+def _vector_backend() -> ClassifierBackend:
+    # scikit-learn is only imported when this backend is selected
+    return importlib.import_module('models.classify_vector').VectorBackend()
+
+
+def _transformer_backend() -> ClassifierBackend:
+    # torch and transformers are optional and only needed for this backend
+    return importlib.import_module('models.classify_transformer').TransformerBackend()
+
+
+# Backend factories by name
+BACKENDS: Dict[str, Callable[[], ClassifierBackend]] = {
+    'rules': RuleBackend,
+    'vector': _vector_backend,
+    'transformer': _transformer_backend,
+}
+
+_instances: Dict[str, ClassifierBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], ClassifierBackend]) -> None:
+    BACKENDS[name] = factory
+
+
+def _drop_fitted_backends(rules: RuleSet) -> None:
+    """
+    Backends fitted to a RuleSet are rebuilt for the new one on next use;
+    requests still holding the old instance finish with it
+    """
+    with _instances_lock:
+        for name in [name for name in _instances if name != 'rules']:
+            del _instances[name]
+
+
+on_reload(_drop_fitted_backends)
+
+
+def get_backend(name: Optional[str] = None) -> ClassifierBackend:
+    """
+    Return the shared instance of a backend, creating it on first use
+    """
+    name = name or CLASSIFIER_BACKEND
+    with _instances_lock:
+        backend = _instances.get(name)
+        if backend is None:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown classifier backend: {name} (available: {', '.join(sorted(BACKENDS))})")
+            backend = BACKENDS[name]()
+            _instances[name] = backend
+            logger.info(f"Loaded classifier backend {name}")
+        return backend
+
+
+def snapshot_backend(name: Optional[str] = None) -> ClassifierBackend:
+    """
+    The backend with its rule set fixed to the one active now, so a whole
+    document is classified and described by the same rules even if the
+    rule pack is reloaded halfway
+    """
+    backend = get_backend(name)
+    if isinstance(backend, RuleBackend):
+        return RuleBackend(backend.rules)
+    return backend
+
+
+def analysis_version(name: Optional[str] = None) -> str:
+    """
+    Version tag for cached results: the ruleset version, qualified by the
+    backend when it is not the rule-based one
+    """
+    name = name or CLASSIFIER_BACKEND
+    version = active_rules().ruleset_version
+    return version if name == 'rules' else f"{version}+{name}"
@@ -1,161 +1,96 @@
 import logging
 import re
-from collections import Counter
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-logger = logging.getLogger(__name__)
-
-# Define clause types and their keywords
-CLAUSE_KEYWORDS = {
-    'confidentiality': [
-        'confidential', 'non-disclosure', 'nda', 'proprietary', 'trade secret',
-        'confidentiality', 'non-disclosure agreement'
-    ],
-    'termination': [
-        'terminate', 'termination', 'end of agreement', 'cancellation',
-        'expiration', 'early termination'
-    ],
-    'payment': [
-        'payment', 'invoice', 'fee', 'price', 'cost', 'payment terms',
-        'payment schedule', 'late payment'
-    ],
-    'liability': [
-        'liability', 'indemnification', 'warranty', 'guarantee',
-        'hold harmless', 'limitation of liability'
-    ],
-    'intellectual_property': [
-        'intellectual property', 'ip', 'copyright', 'patent', 'trademark',
-        'license', 'licensing'
-    ],
-    'governance': [
-        'governing law', 'jurisdiction', 'dispute resolution', 'arbitration',
-        'mediation', 'applicable law'
-    ],
-    'service_level': [
-        'service level', 'sla', 'performance', 'uptime', 'availability',
-        'service quality'
-    ],
-    'data_protection': [
-        'data protection', 'privacy', 'gdpr', 'personal data', 'data security',
-        'data handling'
-    ]
-}
+from models.rule_pack import RuleSet, active_rules
+from utils.clause_memo import CLAUSE_MEMO, normalize_clause
 
-# Define risk indicators
-RISK_INDICATORS = {
-    'High': [
-        'unlimited', 'indemnify', 'warranty', 'guarantee', 'confidential',
-        'terminate', 'breach', 'penalty', 'damages', 'liability'
-    ],
-    'Medium': [
-        'reasonable', 'standard', 'normal', 'typical', 'usual',
-        'customary', 'regular'
-    ],
-    'Low': [
-        'limited', 'restricted', 'standard', 'basic', 'minimum'
-    ]
-}
+logger = logging.getLogger(__name__)
 
-# Define specific concerns for each clause type
-CLAUSE_CONCERNS = {
-    'confidentiality': [
-        'Data protection requirements',
-        'Information sharing restrictions',
-        'Security measures needed',
-        'Potential breach consequences'
-    ],
-    'termination': [
-        'Early termination penalties',
-        'Notice period requirements',
-        'Post-termination obligations',
-        'Transition requirements'
-    ],
-    'payment': [
-        'Payment schedule',
-        'Late payment penalties',
-        'Currency and exchange rates',
-        'Tax implications'
-    ],
-    'liability': [
-        'Financial exposure limits',
-        'Insurance requirements',
-        'Exclusion clauses',
-        'Third-party claims'
-    ],
-    'intellectual_property': [
-        'IP ownership rights',
-        'Usage restrictions',
-        'Infringement risks',
-        'Licensing terms'
-    ],
-    'governance': [
-        'Legal jurisdiction',
-        'Dispute resolution process',
-        'Compliance requirements',
-        'Regulatory framework'
-    ],
-    'service_level': [
-        'Performance metrics',
-        'Service availability',
-        'Response time requirements',
-        'Penalty clauses'
-    ],
-    'data_protection': [
-        'Data handling requirements',
-        'Privacy compliance',
-        'Security measures',
-        'Data breach procedures'
-    ]
-}
+# The keyword tables, concerns and risk levels come from the active rule
+# pack (rules/default.json, see models.rule_pack). Every function takes an
+# optional RuleSet so one document is classified with a single snapshot even
+# if the pack is reloaded meanwhile.
 
-def generate_explanation(clause_type: str, risk_level: str, clause_text: str) -> str:
+def generate_explanation(clause_type: str, risk_level: str, clause_text: str,
+                         rules: Optional[RuleSet] = None) -> str:
     """Generate a detailed explanation for the clause"""
-    concerns = CLAUSE_CONCERNS.get(clause_type, ['No specific concerns identified'])
+    rules = rules or active_rules()
+    concerns = rules.clause_concerns.get(clause_type, ['No specific concerns identified'])
     explanation = f"This {clause_type.replace('_', ' ')} clause has {risk_level.lower()} risk level. "
     explanation += f"It requires attention to: {', '.join(concerns[:2])}."
     return explanation
 
-def classify_clause(clause: str) -> Dict:
+def resolve_hits(hits: set, rules: Optional[RuleSet] = None) -> Tuple[str, str]:
+    """
+    Pick the clause type and risk level from a set of keyword hit tags
+    """
+    return (rules or active_rules()).resolve_hits(hits)
+
+def build_classification(clause_type: str, risk_level: str, clause: str = '',
+                         rules: Optional[RuleSet] = None) -> Dict:
+    """
+    Build the classification payload for a clause type and risk level
+    """
+    rules = rules or active_rules()
+    # Get specific concerns for this clause type
+    specific_concerns = rules.clause_concerns.get(clause_type, [
+        'Standard terms and conditions',
+        'General contractual obligations',
+        'Basic compliance requirements',
+        'Standard business practices'
+    ])
+    
+    # Generate explanation
+    explanation = generate_explanation(clause_type, risk_level, clause, rules)
+    
+    return {
+        'type': clause_type,
+        'risk_level': risk_level,
+        'explanation': explanation,
+        'specific_concerns': specific_concerns
+    }
+
+def _resolver(rules: RuleSet):
+    def resolve_normalized(normalized: str) -> List[str]:
+        return list(rules.resolve_hits(rules.matcher.tags_in(normalized)))
+    return resolve_normalized
+
+def resolve_clause(clause: str, rules: Optional[RuleSet] = None) -> Tuple[str, str]:
+    """
+    Clause type and risk level of a clause. Results are memoized across
+    documents by normalized text and ruleset version.
+    """
+    rules = rules or active_rules()
+    clause_type, risk_level = CLAUSE_MEMO.get_or_compute(
+        rules.ruleset_version, normalize_clause(clause), _resolver(rules)
+    )
+    return clause_type, risk_level
+
+def classify_span(lower_text: str, start: int, end: int,
+                  rules: Optional[RuleSet] = None) -> Tuple[int, int]:
+    """
+    Classify the clause at ``lower_text[start:end]`` and return
+    (type id, risk id) in ``rules``. ``lower_text`` is the lowercased,
+    unnormalized document. The memo is keyed by the normalized clause, so
+    that string is built once here and both the lookup and the keyword scan
+    use it; classify_clause shares the same entries and results.
+    """
+    rules = rules or active_rules()
+    normalized = ' '.join(lower_text[start:end].split())
+    clause_type, risk_level = CLAUSE_MEMO.get_or_compute(rules.ruleset_version, normalized, _resolver(rules))
+    return rules.type_ids[clause_type], rules.risk_ids[risk_level]
+
+def classify_clause(clause: str, rules: Optional[RuleSet] = None) -> Dict:
     """
     Classify a contract clause using rule-based analysis
     """
     try:
-        # Convert to lowercase for case-insensitive matching
-        clause_lower = clause.lower()
-        
-        # Find matching clause types
-        clause_types = []
-        for clause_type, keywords in CLAUSE_KEYWORDS.items():
-            if any(keyword in clause_lower for keyword in keywords):
-                clause_types.append(clause_type)
-        
-        # If no specific type found, classify as General
-        clause_type = clause_types[0] if clause_types else 'General'
-        
-        # Determine risk level
-        risk_level = 'Medium'  # Default risk level
-        for level, indicators in RISK_INDICATORS.items():
-            if any(indicator in clause_lower for indicator in indicators):
-                risk_level = level
-                break
-        
-        # Get specific concerns for this clause type
-        specific_concerns = CLAUSE_CONCERNS.get(clause_type, [
-            'Standard terms and conditions',
-            'General contractual obligations',
-            'Basic compliance requirements',
-            'Standard business practices'
-        ])
-        
-        # Generate explanation
-        explanation = generate_explanation(clause_type, risk_level, clause)
-        
-        return {
-            'type': clause_type,
-            'risk_level': risk_level,
-            'explanation': explanation,
-            'specific_concerns': specific_concerns
-        }
+        # Matching is case-insensitive and whitespace-insensitive; the
+        # keyword scan only runs for clauses not seen before
+        rules = rules or active_rules()
+        clause_type, risk_level = resolve_clause(clause, rules)
+        return build_classification(clause_type, risk_level, clause, rules)
         
     except Exception as e:
         logger.error(f"Error classifying clause: {str(e)}")
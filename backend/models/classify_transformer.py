@@ -0,0 +1,330 @@
+"""
+Optional CPU transformer backend for clause type and risk.
+
+Select it with CLASSIFIER_BACKEND=transformer and point TRANSFORMER_MODEL at
+a local sequence classification model whose labels are named
+'type:<clause type>' and 'risk:<risk level>'. torch and transformers are
+only imported when the backend is created.
+
+A tiny randomly initialized model for offline testing can be built with:
+
+    python -m models.classify_transformer build-tiny models/artifacts/tiny-transformer
+    python -m models.classify_transformer bench models/artifacts/tiny-transformer
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from models.backends import ClassifierBackend, RuleBackend
+from models.rule_pack import RuleSet, active_rules
+
+logger = logging.getLogger(__name__)
+
+TRANSFORMER_MODEL = os.environ.get('TRANSFORMER_MODEL', '')
+# Clauses per forward pass
+TRANSFORMER_MAX_BATCH = int(os.environ.get('TRANSFORMER_MAX_BATCH', 32))
+# How long the batcher waits for more clauses once the first one arrives
+TRANSFORMER_MAX_WAIT = float(os.environ.get('TRANSFORMER_MAX_WAIT_MS', 10)) / 1000
+# Seconds a request waits for the model before falling back to the rules
+TRANSFORMER_TIMEOUT = float(os.environ.get('TRANSFORMER_TIMEOUT', 5.0))
+# Intra-op threads for torch; kept low so several HTTP workers can share a host
+TRANSFORMER_THREADS = int(os.environ.get('TRANSFORMER_THREADS', min(4, os.cpu_count() or 1)))
+# Tokens per clause after truncation
+TRANSFORMER_MAX_LENGTH = int(os.environ.get('TRANSFORMER_MAX_LENGTH', 256))
+
+
+class PendingClause(NamedTuple):
+    input_ids: List[int]
+    future: Future
+
+
+class DynamicBatcher:
+    """
+    Collects clauses submitted from any thread and runs them through
+    ``infer`` in batches. A batch is closed when ``max_batch_size``
+    clauses are waiting or ``max_wait`` seconds after its first clause
+    arrived. Waiting clauses are bucketed by token length so a batch pads to
+    roughly its own length rather than to the longest clause in the queue.
+
+    The worker thread is started on first use and restarted in a forked
+    child, where the parent's thread does not exist.
+    """
+
+    def __init__(self, infer, max_batch_size: int = TRANSFORMER_MAX_BATCH,
+                 max_wait: float = TRANSFORMER_MAX_WAIT):
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: 'queue.Queue[PendingClause]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'batches': 0,
+            'clauses': 0,
+            'tokens': 0,
+            'padded_tokens': 0,
+            'inference_seconds': 0.0,
+            'errors': 0,
+        }
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='transformer-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, input_ids: List[int]) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put(PendingClause(input_ids, future))
+        return future
+
+    def _collect(self) -> List[PendingClause]:
+        pending = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        # Gather a few batches' worth so that bucketing has something to sort
+        while len(pending) < self.max_batch_size * 4:
+            remaining = max(deadline - time.perf_counter(), 0)
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _batches(self, pending: List[PendingClause]) -> List[List[PendingClause]]:
+        # Neighbours in length order share a batch, so every batch but the
+        # last is full and pads only to its own longest clause
+        pending = sorted(pending, key=lambda item: len(item.input_ids))
+        size = self.max_batch_size
+        return [pending[i:i + size] for i in range(0, len(pending), size)]
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            # Clauses whose caller already gave up are dropped here
+            pending = [item for item in pending if item.future.set_running_or_notify_cancel()]
+            for batch in self._batches(pending):
+                started = time.perf_counter()
+                try:
+                    results = self.infer([item.input_ids for item in batch])
+                except Exception as e:
+                    logger.error(f"Transformer batch failed: {str(e)}")
+                    with self._lock:
+                        self._stats['errors'] += 1
+                    for item in batch:
+                        item.future.set_exception(e)
+                    continue
+                elapsed = time.perf_counter() - started
+
+                for item, result in zip(batch, results):
+                    item.future.set_result(result)
+                with self._lock:
+                    self._stats['batches'] += 1
+                    self._stats['clauses'] += len(batch)
+                    self._stats['tokens'] += sum(len(item.input_ids) for item in batch)
+                    self._stats['padded_tokens'] += len(batch) * max(len(item.input_ids) for item in batch)
+                    self._stats['inference_seconds'] += elapsed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        seconds = stats['inference_seconds']
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000
+        stats['batch_fill_rate'] = stats['clauses'] / (batches * self.max_batch_size) if batches else 0.0
+        stats['padding_efficiency'] = stats['tokens'] / stats['padded_tokens'] if stats['padded_tokens'] else 0.0
+        stats['tokens_per_second'] = stats['tokens'] / seconds if seconds else 0.0
+        stats['clauses_per_second'] = stats['clauses'] / seconds if seconds else 0.0
+        return stats
+
+
+def label_ids(id2label: Dict, rules: RuleSet) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """
+    Split model output indices into clause type and risk level heads and
+    map each to the type / risk ids of ``rules``
+    """
+    type_columns, type_ids, risk_columns, risk_ids = [], [], [], []
+    for column, label in sorted((int(key), label) for key, label in id2label.items()):
+        kind, _, name = label.partition(':')
+        if kind == 'type' and name in rules.type_ids:
+            type_columns.append(column)
+            type_ids.append(rules.type_ids[name])
+        elif kind == 'risk' and name in rules.risk_ids:
+            risk_columns.append(column)
+            risk_ids.append(rules.risk_ids[name])
+    if not type_columns or not risk_columns:
+        raise ValueError("Model labels must include 'type:<clause type>' and 'risk:<risk level>' entries")
+    return type_columns, type_ids, risk_columns, risk_ids
+
+
+class TransformerBackend(ClassifierBackend):
+    """
+    Local sequence classification model behind a DynamicBatcher. Clauses
+    from concurrent requests share forward passes; any clause that is not
+    classified within ``timeout`` seconds is classified by the rules.
+    """
+
+    name = 'transformer'
+
+    def __init__(self, model_path: Optional[str] = None, timeout: float = TRANSFORMER_TIMEOUT,
+                 max_batch_size: int = TRANSFORMER_MAX_BATCH, max_wait: float = TRANSFORMER_MAX_WAIT,
+                 threads: int = TRANSFORMER_THREADS, rules: Optional[RuleSet] = None):
+        super().__init__(rules)
+        # Tokenization happens on request threads; its own thread pool would
+        # only compete with torch and breaks when workers fork
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        model_path = model_path or TRANSFORMER_MODEL
+        if not model_path:
+            raise ValueError('TRANSFORMER_MODEL is not set')
+
+        torch.set_num_threads(threads)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_path, local_files_only=True)
+        self.model.eval()
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+        self.type_columns, self.type_ids, self.risk_columns, self.risk_ids = label_ids(self.model.config.id2label, self.rules)
+
+        self.timeout = timeout
+        self.fallback = RuleBackend(self.rules)
+        self.fallbacks = 0
+        # Request threads count their fallbacks concurrently
+        self._fallbacks_lock = threading.Lock()
+        self.batcher = DynamicBatcher(self._infer, max_batch_size, max_wait)
+        logger.info(f"Loaded transformer model from {model_path} ({threads} threads)")
+
+    def _infer(self, batch: List[List[int]]) -> List[Tuple[int, int]]:
+        torch = self.torch
+        length = max(len(input_ids) for input_ids in batch)
+        input_ids = torch.full((len(batch), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+        for row, ids in enumerate(batch):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        with torch.inference_mode():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+        type_index = logits[:, self.type_columns].argmax(dim=1).tolist()
+        risk_index = logits[:, self.risk_columns].argmax(dim=1).tolist()
+        return [(self.type_ids[t], self.risk_ids[r]) for t, r in zip(type_index, risk_index)]
+
+    def classify_ids(self, clauses: List[str]) -> List[Tuple[int, int]]:
+        if not clauses:
+            return []
+        encoded = self.tokenizer(clauses, truncation=True, max_length=TRANSFORMER_MAX_LENGTH)['input_ids']
+        futures = [self.batcher.submit(input_ids) for input_ids in encoded]
+        wait(futures, timeout=self.timeout)
+
+        result = []
+        late = []
+        for index, future in enumerate(futures):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                result.append(future.result())
+            else:
+                future.cancel()
+                late.append(index)
+                result.append(None)
+
+        if late:
+            with self._fallbacks_lock:
+                self.fallbacks += len(late)
+            logger.warning(f"{len(late)} of {len(clauses)} clauses fell back to the rules")
+            for index, ids in zip(late, self.fallback.classify_ids([clauses[i] for i in late])):
+                result[index] = ids
+        return result
+
+    def stats(self) -> Dict:
+        stats = self.batcher.stats()
+        with self._fallbacks_lock:
+            stats['fallbacks'] = self.fallbacks
+        stats['timeout'] = self.timeout
+        return stats
+
+
+def build_tiny_model(path: str, seed: int = 0) -> str:
+    """
+    Save a tiny randomly initialized BERT classifier with the expected
+    labels and a vocabulary drawn from the rule tables. Its predictions are
+    meaningless; it exists to exercise the backend offline.
+    """
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    rules = active_rules()
+    words = set()
+    for table in (rules.clause_keywords, rules.risk_indicators):
+        for keywords in table.values():
+            for keyword in keywords:
+                words.update(keyword.lower().replace('-', ' ').split())
+    characters = [chr(c) for c in range(ord('a'), ord('z') + 1)] + list('0123456789.,;:()-')
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + characters + [f'##{c}' for c in characters] + sorted(words)
+    vocab_file = os.path.join(path, 'vocab.txt')
+    with open(vocab_file, 'w') as file:
+        file.write('\n'.join(dict.fromkeys(vocab)) + '\n')
+
+    labels = [f'type:{name}' for name in rules.type_names] + [f'risk:{name}' for name in rules.risk_names]
+    config = BertConfig(
+        vocab_size=len(dict.fromkeys(vocab)),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=TRANSFORMER_MAX_LENGTH,
+        num_labels=len(labels),
+        id2label=dict(enumerate(labels)),
+        label2id={label: i for i, label in enumerate(labels)},
+    )
+    torch.manual_seed(seed)
+    BertForSequenceClassification(config).save_pretrained(path)
+    BertTokenizerFast(vocab_file=vocab_file, do_lower_case=True,
+                      model_max_length=TRANSFORMER_MAX_LENGTH).save_pretrained(path)
+    return path
+
+
+def bench(path: str, clauses: int = 2000, clients: int = 8) -> Dict:
+    """
+    Classify synthetic clauses from several threads at once and return the
+    batcher statistics
+    """
+    from benchmarks.synthetic import generate_clauses
+
+    backend = TransformerBackend(path)
+    texts = generate_clauses(clauses, seed=1)
+    shard = (len(texts) + clients - 1) // clients
+    threads = [
+        threading.Thread(target=backend.classify_ids, args=(texts[i:i + shard],))
+        for i in range(0, len(texts), shard)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = backend.stats()
+    stats['wall_seconds'] = time.perf_counter() - start
+    return stats
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    command, target = sys.argv[1], sys.argv[2]
+    if command == 'build-tiny':
+        print(build_tiny_model(target))
+    elif command == 'bench':
+        print(json.dumps(bench(target), indent=2))
+    else:
+        raise SystemExit(f"Unknown command: {command}")
@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from models.backends import ClassifierBackend
+from models.rule_pack import RuleSet, active_rules
+
+logger = logging.getLogger(__name__)
+
+# Fitted weight matrices are stored here, one directory per ruleset version
+ARTIFACT_DIR = os.environ.get(
+    'VECTOR_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')
+)
+
+# Hash space of the vectorizer; large enough that a candidate n-gram
+# colliding with a keyword feature is negligible
+N_FEATURES = 2 ** 30
+
+# Words and single punctuation marks, so 'non-disclosure' is the 3-gram
+# 'non - disclosure' and keywords keep the word boundaries of the rule matcher
+TOKEN_PATTERN = r'(?u)\w+|[^\w\s]'
+TOKEN_RE = re.compile(TOKEN_PATTERN)
+
+
+class KeywordNgramAnalyzer:
+    """
+    Turns a clause into its candidate n-grams: every n-gram up to
+    ``max_ngram`` tokens that starts with the first token of some multi-word
+    keyword, plus single tokens. Like the rule matcher, which only needs a
+    word boundary before a keyword, the last token of an n-gram may be a
+    prefix of the clause token, so 'fee' is emitted for 'fees' and
+    'payment schedule' for 'payment schedules'. Only the prefixes that end
+    some keyword (``last_tokens``) are emitted; no other n-gram can be a
+    keyword feature, and skipping them avoids generating and hashing every
+    n-gram of every clause.
+    """
+
+    def __init__(self, first_tokens, last_tokens, max_ngram: int):
+        self.first_tokens = frozenset(first_tokens)
+        self.last_tokens = frozenset(last_tokens)
+        self.prefix_lengths = sorted({len(token) for token in self.last_tokens})
+        self.max_ngram = max_ngram
+
+    def prefixes(self, token: str) -> List[str]:
+        last_tokens = self.last_tokens
+        return [token[:size] for size in self.prefix_lengths
+                if size <= len(token) and token[:size] in last_tokens]
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = TOKEN_RE.findall(text.lower())
+        first_tokens = self.first_tokens
+        prefixes = {token: self.prefixes(token) for token in set(tokens)}
+        grams = []
+        for i, token in enumerate(tokens):
+            grams.extend(prefixes[token])
+            if token not in first_tokens:
+                continue
+            for size in range(2, min(self.max_ngram, len(tokens) - i) + 1):
+                head = ' '.join(tokens[i:i + size - 1])
+                grams.extend(f'{head} {prefix}' for prefix in prefixes[tokens[i + size - 1]])
+        return grams
+
+
+def make_vectorizer(first_tokens, last_tokens, max_ngram: int,
+                    n_features: int = N_FEATURES) -> HashingVectorizer:
+    return HashingVectorizer(
+        n_features=n_features,
+        analyzer=KeywordNgramAnalyzer(first_tokens, last_tokens, max_ngram),
+        alternate_sign=False,
+        norm=None,
+        binary=True,
+        dtype=np.float32
+    )
+
+
+def _contains(tokens: Tuple[str, ...], other: Tuple[str, ...]) -> bool:
+    return any(tokens[i:i + len(other)] == other for i in range(len(tokens) - len(other) + 1))
+
+
+def label_keywords(clause_keywords: Dict[str, List[str]],
+                   risk_indicators: Dict[str, List[str]]) -> Tuple[List[List[str]], List[Tuple[str, ...]]]:
+    """
+    Return the labels (clause types, then risk levels, in table order) and
+    the token sequence of each of their keywords. A keyword that contains a
+    shorter keyword of the same label can never change the outcome and is
+    dropped, which keeps the n-gram range (and the vectorizer cost) small.
+    """
+    labels = [['type', name] for name in clause_keywords] + [['risk', name] for name in risk_indicators]
+    tables = list(clause_keywords.values()) + list(risk_indicators.values())
+
+    keywords = []
+    for table in tables:
+        sequences = {tuple(TOKEN_RE.findall(keyword.lower())) for keyword in table}
+        keywords.append(sorted(
+            tokens for tokens in sequences
+            if not any(other != tokens and _contains(tokens, other) for other in sequences)
+        ))
+    return labels, keywords
+
+
+def build_weights(rules: RuleSet, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Fit the model from the rule tables: the sorted hashed feature ids of all
+    keyword n-grams and a (features x labels) weight matrix with a 1 where
+    a feature belongs to a label
+    """
+    clause_keywords = rules.clause_keywords
+    labels, keywords = label_keywords(clause_keywords, rules.risk_indicators)
+    max_ngram = max(len(tokens) for sequences in keywords for tokens in sequences)
+    first_tokens = sorted({tokens[0] for sequences in keywords for tokens in sequences if len(tokens) > 1})
+    last_tokens = sorted({tokens[-1] for sequences in keywords for tokens in sequences})
+
+    # Hash each full keyword n-gram the same way clause n-grams are hashed
+    hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+    feature_labels: Dict[int, set] = {}
+    for column, sequences in enumerate(keywords):
+        for tokens in sequences:
+            feature = int(hasher.transform([[' '.join(tokens)]]).indices[0])
+            feature_labels.setdefault(feature, set()).add(column)
+
+    features = np.array(sorted(feature_labels), dtype=np.int64)
+    weights = np.zeros((len(features), len(labels)), dtype=np.float32)
+    for row, feature in enumerate(features):
+        weights[row, sorted(feature_labels[int(feature)])] = 1
+
+    meta = {
+        'ruleset_version': rules.ruleset_version,
+        'n_features': n_features,
+        'max_ngram': max_ngram,
+        'first_tokens': first_tokens,
+        'last_tokens': last_tokens,
+        'token_pattern': TOKEN_PATTERN,
+        'labels': labels,
+        'n_types': len(clause_keywords),
+    }
+    return features, weights, meta
+
+
+def save_artifacts(features: np.ndarray, weights: np.ndarray, meta: Dict, model_dir: str) -> str:
+    """
+    Write the model as raw .npy arrays plus a JSON header. The directory is
+    written under a temporary name and renamed into place so concurrent
+    workers never see a partial model.
+    """
+    parent = os.path.dirname(model_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        np.save(os.path.join(tmp_dir, 'features.npy'), features)
+        np.save(os.path.join(tmp_dir, 'weights.npy'), weights)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        os.rename(tmp_dir, model_dir)
+    except OSError:
+        # Another process published the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(model_dir):
+            raise
+    return model_dir
+
+
+def load_artifacts(model_dir: str) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Memory-map a saved model, so loading it costs a few page faults that
+    forked workers share
+    """
+    with open(os.path.join(model_dir, 'meta.json')) as file:
+        meta = json.load(file)
+    features = np.load(os.path.join(model_dir, 'features.npy'), mmap_mode='r')
+    weights = np.load(os.path.join(model_dir, 'weights.npy'), mmap_mode='r')
+    return features, weights, meta
+
+
+def model_path(rules: Optional[RuleSet] = None) -> str:
+    # Rule set versions contain '@' and ':', which are not portable in paths
+    version = (rules or active_rules()).ruleset_version.replace('@', '-').replace(':', '-')
+    return os.path.join(ARTIFACT_DIR, f'vector-{version}')
+
+
+def load_or_build(model_dir: Optional[str] = None,
+                  rules: Optional[RuleSet] = None) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Load the artifacts for a rule set (by default the active one), fitting
+    and saving them first if they do not exist yet
+    """
+    rules = rules or active_rules()
+    model_dir = model_dir or model_path(rules)
+    if os.path.exists(os.path.join(model_dir, 'meta.json')):
+        features, weights, meta = load_artifacts(model_dir)
+        if (meta['ruleset_version'] == rules.ruleset_version and meta['token_pattern'] == TOKEN_PATTERN
+                and 'last_tokens' in meta):
+            return features, weights, meta
+        logger.warning(f"Vector model in {model_dir} is stale, rebuilding in memory")
+        return build_weights(rules)
+
+    features, weights, meta = build_weights(rules)
+    try:
+        save_artifacts(features, weights, meta, model_dir)
+        logger.info(f"Saved vector model to {model_dir}")
+    except OSError as e:
+        logger.warning(f"Could not save vector model to {model_dir}: {str(e)}")
+    return features, weights, meta
+
+
+class VectorBackend(ClassifierBackend):
+    """
+    Classifies a whole list of clauses at once: the clauses become one
+    sparse hashed n-gram matrix, its keyword columns are projected onto the
+    model's feature table, and a single sparse product with the weight
+    matrix scores every clause against every clause type and risk level.
+    Results follow the rule-based backend: keywords match at the start of a
+    token and may end inside one, the first matching type in table order
+    wins (else General) and so does the first matching risk level (else
+    Medium).
+    """
+
+    name = 'vector'
+
+    def __init__(self, model_dir: Optional[str] = None, rules: Optional[RuleSet] = None):
+        super().__init__(rules)
+        self.features, self.weights, self.meta = load_or_build(model_dir, self.rules)
+        self.n_types = self.meta['n_types']
+        self.vectorizer = make_vectorizer(
+            self.meta['first_tokens'], self.meta['last_tokens'], self.meta['max_ngram'], self.meta['n_features']
+        )
+        self.default_risk = self.rules.risk_ids[self.rules.default_risk]
+
+    def score(self, clauses: List[str]) -> np.ndarray:
+        """
+        Return a (clauses x labels) array of keyword hit counts
+        """
+        matrix = self.vectorizer.transform(clauses)
+        # Keep only the keyword features, renumbered to model rows
+        positions = np.searchsorted(self.features, matrix.indices)
+        positions[positions == len(self.features)] = 0
+        hit = self.features[positions] == matrix.indices
+        rows = np.repeat(np.arange(len(clauses)), np.diff(matrix.indptr))[hit]
+        keyword_matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, positions[hit])),
+            shape=(len(clauses), len(self.features))
+        )
+        return np.asarray(keyword_matrix @ self.weights)
+
+    def classify_ids(self, clauses: List[str]) -> List[Tuple[int, int]]:
+        if not clauses:
+            return []
+        hits = self.score(clauses) > 0
+        type_hits = hits[:, :self.n_types]
+        risk_hits = hits[:, self.n_types:]
+        # Type ids are offset by one for 'General'
+        type_ids = np.where(type_hits.any(axis=1), type_hits.argmax(axis=1) + 1, 0)
+        risk_ids = np.where(risk_hits.any(axis=1), risk_hits.argmax(axis=1), self.default_risk)
+        return list(zip(type_ids.tolist(), risk_ids.tolist()))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    path = model_path()
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    load_or_build(path)
+    print(path)
@@ -0,0 +1,277 @@
+"""
+Versioned rule packs.
+
+The keyword tables, risk indicators, concerns and regex patterns used by the
+rule-based classifiers live in a JSON rule pack (rules/default.json). A pack
+is compiled into a RuleSet - keyword automaton, label tables and ids - and
+the compiled RuleSet is pickled next to the pack, so workers load it instead
+of rebuilding it. Build it ahead of a deploy with
+
+    python -m models.rule_pack compile [rules/default.json]
+
+The active RuleSet is swapped atomically when the pack file changes (or on
+reload_rules()); callers take one snapshot per document, so requests in
+flight finish with the rules they started with.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rule pack used by the rule-based classifiers
+RULE_PACK_PATH = os.environ.get('RULE_PACK', os.path.join(BACKEND_DIR, 'rules', 'default.json'))
+
+# Compiled RuleSets are stored here, one file per pack fingerprint
+RULE_ARTIFACT_DIR = os.environ.get('RULE_ARTIFACT_DIR', os.path.join(BACKEND_DIR, 'rules', 'compiled'))
+
+# Seconds between checks of the pack file for changes; 0 disables hot reload
+RULE_PACK_CHECK_INTERVAL = float(os.environ.get('RULE_PACK_CHECK_INTERVAL', 2.0))
+
+# Bumped whenever the pickled RuleSet layout changes
+ARTIFACT_FORMAT = 1
+
+REQUIRED_FIELDS = ('name', 'version', 'clause_keywords', 'risk_indicators', 'clause_concerns')
+
+
+class RuleSet:
+    """
+    A compiled, immutable rule pack. Clause type ids start at 1; id 0 is
+    'General', used when no keyword matches.
+    """
+
+    def __init__(self, pack: Dict, fingerprint: str):
+        self.name = pack['name']
+        self.version = pack['version']
+        self.fingerprint = fingerprint
+        # Stamped on results
+        self.version_tag = f"{self.name}@{self.version}"
+        # Namespace of cached results and memo entries; the fingerprint also
+        # changes when a pack is edited without bumping its version
+        self.ruleset_version = f"{self.version_tag}:{fingerprint}"
+
+        self.clause_keywords: Dict[str, List[str]] = pack['clause_keywords']
+        self.risk_indicators: Dict[str, List[str]] = pack['risk_indicators']
+        self.clause_concerns: Dict[str, List[str]] = pack['clause_concerns']
+        self.patterns: Dict[str, Dict] = pack.get('patterns', {})
+        self.default_risk: str = pack.get('default_risk', 'Medium')
+
+        self.type_names = ['General'] + list(self.clause_keywords)
+        self.risk_names = list(self.risk_indicators)
+        self.type_ids = {name: i for i, name in enumerate(self.type_names)}
+        self.risk_ids = {name: i for i, name in enumerate(self.risk_names)}
+        self.matcher = build_keyword_matcher(self.clause_keywords, self.risk_indicators)
+
+    def resolve_hits(self, hits: set) -> Tuple[str, str]:
+        """
+        Pick the clause type and risk level from a set of keyword hit tags:
+        the first matching type and risk level in table order
+        """
+        clause_type = next(
+            (name for name in self.clause_keywords if ('type', name) in hits), 'General'
+        )
+        risk_level = next(
+            (level for level in self.risk_indicators if ('risk', level) in hits), self.default_risk
+        )
+        return clause_type, risk_level
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'version': self.version,
+            'fingerprint': self.fingerprint,
+            'clause_types': len(self.clause_keywords),
+            'keywords': len(self.matcher.keywords),
+            'patterns': sum(len(info['patterns']) for info in self.patterns.values()),
+        }
+
+
+def build_keyword_matcher(clause_keywords: Dict[str, List[str]],
+                          risk_indicators: Dict[str, List[str]]) -> KeywordMatcher:
+    """
+    Compile the clause keyword and risk indicator tables into one matcher.
+    Hits are tagged ('type', clause_type) or ('risk', level) so a single scan
+    answers both questions.
+    """
+    entries = [
+        (keyword, ('type', clause_type))
+        for clause_type, keywords in clause_keywords.items()
+        for keyword in keywords
+    ]
+    entries += [
+        (indicator, ('risk', level))
+        for level, indicators in risk_indicators.items()
+        for indicator in indicators
+    ]
+    return KeywordMatcher(entries)
+
+
+def read_pack(path: str) -> Tuple[Dict, str]:
+    """
+    Load and validate a rule pack; returns it with its content fingerprint
+    """
+    with open(path, 'rb') as file:
+        raw = file.read()
+    pack = json.loads(raw)
+    missing = [field for field in REQUIRED_FIELDS if field not in pack]
+    if missing:
+        raise ValueError(f"Rule pack {path} is missing {', '.join(missing)}")
+    for table in ('clause_keywords', 'risk_indicators', 'clause_concerns'):
+        if not all(isinstance(values, list) for values in pack[table].values()):
+            raise ValueError(f"Rule pack {path}: every entry of {table} must be a list")
+    if not pack['risk_indicators']:
+        raise ValueError(f"Rule pack {path} defines no risk levels")
+    if pack.get('default_risk', 'Medium') not in pack['risk_indicators']:
+        raise ValueError(f"Rule pack {path}: default_risk is not one of its risk levels")
+    canonical = json.dumps(pack, sort_keys=True, separators=(',', ':'))
+    return pack, hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def artifact_path(pack: Dict, fingerprint: str, artifact_dir: Optional[str] = None) -> str:
+    return os.path.join(artifact_dir or RULE_ARTIFACT_DIR, f"{pack['name']}-{fingerprint}.pickle")
+
+
+def save_artifact(rules: RuleSet, path: str) -> str:
+    """
+    Pickle a RuleSet, written under a temporary name and renamed into place
+    so a concurrent loader never sees a partial file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump({'format': ARTIFACT_FORMAT, 'rules': rules}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_artifact(path: str, fingerprint: str) -> Optional[RuleSet]:
+    """
+    The RuleSet pickled at ``path`` if it was compiled from a pack with this
+    fingerprint, else None. Artifacts are only read from the local
+    RULE_ARTIFACT_DIR, which holds files this module wrote.
+    """
+    try:
+        with open(path, 'rb') as file:
+            payload = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable rule artifact {path}: {str(e)}")
+        return None
+    rules = payload.get('rules') if payload.get('format') == ARTIFACT_FORMAT else None
+    if rules is None or rules.fingerprint != fingerprint:
+        return None
+    return rules
+
+
+def compile_pack(path: str = RULE_PACK_PATH, artifact_dir: Optional[str] = None) -> RuleSet:
+    """
+    Return the compiled RuleSet for a pack, loading its artifact when one
+    exists and compiling and saving it otherwise
+    """
+    pack, fingerprint = read_pack(path)
+    target = artifact_path(pack, fingerprint, artifact_dir)
+    rules = load_artifact(target, fingerprint)
+    if rules is not None:
+        return rules
+
+    started = time.perf_counter()
+    rules = RuleSet(pack, fingerprint)
+    logger.info(f"Compiled rule pack {rules.version_tag} in {time.perf_counter() - started:.3f}s")
+    try:
+        save_artifact(rules, target)
+    except OSError as e:
+        logger.warning(f"Could not save rule artifact {target}: {str(e)}")
+    return rules
+
+
+_active: Optional[RuleSet] = None
+_active_mtime: Optional[float] = None
+_next_check = 0.0
+_reload_lock = threading.Lock()
+_listeners: List[Callable[[RuleSet], None]] = []
+
+
+def on_reload(listener: Callable[[RuleSet], None]) -> None:
+    """Call ``listener`` with the new RuleSet after every reload"""
+    _listeners.append(listener)
+
+
+def _pack_mtime() -> Optional[float]:
+    try:
+        return os.stat(RULE_PACK_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def reload_rules(force: bool = False) -> RuleSet:
+    """
+    Load the rule pack again if its file changed (or always with ``force``)
+    and make it active. A pack that fails to load or validate is logged and
+    the current rules stay active.
+    """
+    global _active, _active_mtime
+    with _reload_lock:
+        mtime = _pack_mtime()
+        if _active is not None and not force and mtime == _active_mtime:
+            return _active
+        try:
+            rules = compile_pack(RULE_PACK_PATH)
+        except Exception as e:
+            if _active is None:
+                raise
+            logger.error(f"Keeping rule pack {_active.version_tag}; reload failed: {str(e)}")
+            _active_mtime = mtime
+            return _active
+        previous = _active
+        _active, _active_mtime = rules, mtime
+
+    if previous is not None and previous.ruleset_version != rules.ruleset_version:
+        logger.info(f"Rule pack reloaded: {previous.version_tag} -> {rules.version_tag}")
+        for listener in list(_listeners):
+            listener(rules)
+    return rules
+
+
+def active_rules() -> RuleSet:
+    """
+    The current RuleSet. Checks the pack file for changes at most every
+    RULE_PACK_CHECK_INTERVAL seconds.
+    """
+    global _next_check
+    rules = _active
+    if rules is None:
+        return reload_rules()
+    if RULE_PACK_CHECK_INTERVAL > 0:
+        now = time.monotonic()
+        if now >= _next_check:
+            _next_check = now + RULE_PACK_CHECK_INTERVAL
+            if _pack_mtime() != _active_mtime:
+                return reload_rules()
+    return rules
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'compile':
+        print('usage: python -m models.rule_pack compile [PACK]', file=sys.stderr)
+        sys.exit(2)
+    pack_path = sys.argv[2] if len(sys.argv) > 2 else RULE_PACK_PATH
+    pack, fingerprint = read_pack(pack_path)
+    compiled = RuleSet(pack, fingerprint)
+    print(save_artifact(compiled, artifact_path(pack, fingerprint)))
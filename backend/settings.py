@@ -0,0 +1,24 @@
+"""
+Upload and service settings shared by the Flask app (app.py) and the ASGI
+variant (asgi.py). Importing this module builds nothing, so either server
+can read the settings without pulling in the other.
+"""
+import os
+
+# Configure upload settings
+UPLOAD_FOLDER = 'uploads'
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB max file size
+# The streaming endpoint never holds a whole result, so it may accept larger files
+STREAM_MAX_CONTENT_LENGTH = int(os.environ.get('STREAM_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
+ANALYSIS_CACHE_SIZE = 128  # results kept in memory; the SQLite tier is unbounded
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+# Jobs queued or running per server process before /api/jobs answers 503
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', 64))
+NEAR_DUPLICATES = os.environ.get('NEAR_DUPLICATES', '1') != '0'
+ANALYSIS_STORE = os.environ.get('ANALYSIS_STORE', '1') != '0'
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
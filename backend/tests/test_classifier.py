@@ -0,0 +1,18 @@
+from models.classify_llm import classify_clause
+from utils.classifier import RuleBasedClassifier
+
+
+def test_patterns_match_across_line_breaks():
+    classifier = RuleBasedClassifier()
+    assert classifier.classify_clause('At the end of\nagreement all copies are returned')['type'] == 'termination'
+    assert classifier.classify_clause('At the end of  agreement all copies are returned')['type'] == 'termination'
+
+
+def test_line_break_variants_share_a_result():
+    classifier = RuleBasedClassifier()
+    results = classifier.analyze_contract(['Payment   terms\napply.', 'payment terms apply.'])
+    assert results[0] == results[1]
+
+
+def test_keywords_match_across_line_breaks():
+    assert classify_clause('Each trade\nsecret stays with its owner')['type'] == 'confidentiality'
@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from benchmarks.synthetic import generate_clauses
+from models.backends import RuleBackend
+from models.classify_vector import VectorBackend
+
+
+@pytest.fixture(scope='module')
+def backends(tmp_path_factory):
+    model_dir = str(tmp_path_factory.mktemp('vector') / 'model')
+    return VectorBackend(model_dir=model_dir), RuleBackend()
+
+
+@pytest.mark.parametrize('clause, clause_type, risk_level', [
+    ('The fees are due.', 'payment', 'Medium'),
+    ('payments schedule', 'payment', 'Medium'),
+    ('This agreement may be terminated', 'termination', 'High'),
+    ('Confidentiality obligations survive', 'confidentiality', 'High'),
+])
+def test_keyword_prefixes(backends, clause, clause_type, risk_level):
+    vector, _ = backends
+    result = vector.classify_batch([clause])[0]
+    assert (result['type'], result['risk_level']) == (clause_type, risk_level)
+
+
+def test_parity_with_rule_backend(backends):
+    vector, rules = backends
+    rng = random.Random(0)
+    clauses = [
+        # Inflect some words so keywords also end inside a token
+        ' '.join(word + rng.choice(['s', 'd', 'ing']) if rng.random() < 0.3 else word
+                 for word in clause.split())
+        for clause in generate_clauses(500, keyword_density=0.05, seed=0)
+    ]
+    assert vector.classify_ids(clauses) == rules.classify_ids(clauses)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(content: bytes, ruleset_version: str) -> str:
+    """
+    Build a cache key from the raw upload bytes and the ruleset version
+    """
+    return digest_key(hashlib.sha256(content).hexdigest(), ruleset_version)
+
+
+def digest_key(digest: str, ruleset_version: str) -> str:
+    """
+    Cache key for content whose SHA-256 hex digest is already known
+    """
+    return f"{digest}:{ruleset_version}"
+
+
+def key_version(key: str) -> str:
+    """
+    The ruleset version part of a cache key. Versions may contain ':'
+    themselves; the digest never does.
+    """
+    return key.split(':', 1)[-1]
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of analysis results keyed by content hash and ruleset
+    version. A bounded in-memory LRU sits in front of a SQLite table that
+    persists results across restarts.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 128):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'stores': 0,
+        }
+        self._conn = None
+        self._conn_pid = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # A connection must not cross a fork, so each process opens its own
+        if not self.db_path:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS analyses ('
+                ' key TEXT PRIMARY KEY,'
+                ' ruleset_version TEXT NOT NULL,'
+                ' result TEXT NOT NULL,'
+                ' created_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_analyses_version ON analyses (ruleset_version)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, result: Dict) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached result for ``key`` or None
+        """
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return result
+
+            conn = self._connection()
+            if conn is not None:
+                row = conn.execute(
+                    'SELECT result FROM analyses WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self._counters['disk_hits'] += 1
+                    return result
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, key: str, result: Dict) -> None:
+        """
+        Store a result in both tiers
+        """
+        ruleset_version = key_version(key)
+        with self._lock:
+            self._remember(key, result)
+            self._counters['stores'] += 1
+            conn = self._connection()
+            if conn is not None:
+                conn.execute(
+                    'INSERT OR REPLACE INTO analyses (key, ruleset_version, result, created_at)'
+                    ' VALUES (?, ?, ?, ?)',
+                    (key, ruleset_version, json.dumps(result), time.time())
+                )
+                conn.commit()
+
+    def invalidate(self, keep_version: Optional[str] = None) -> int:
+        """
+        Drop cached results. With ``keep_version`` only entries produced by
+        other ruleset versions are removed, otherwise everything is cleared.
+        Returns the number of entries removed from the persistent tier.
+        """
+        with self._lock:
+            if keep_version is None:
+                self._memory.clear()
+            else:
+                for key in [k for k in self._memory if not k.endswith(f':{keep_version}')]:
+                    del self._memory[key]
+
+            removed = 0
+            conn = self._connection()
+            if conn is not None:
+                if keep_version is None:
+                    cursor = conn.execute('DELETE FROM analyses')
+                else:
+                    cursor = conn.execute(
+                        'DELETE FROM analyses WHERE ruleset_version != ?', (keep_version,)
+                    )
+                removed = cursor.rowcount
+                conn.commit()
+
+        logger.info(f"Invalidated analysis cache ({removed} persisted entries removed)")
+        return removed
+
+    def stats(self) -> Dict:
+        """
+        Return hit/miss/eviction counters and tier sizes
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            stats['memory_entries'] = len(self._memory)
+            stats['max_entries'] = self.max_entries
+            conn = self._connection()
+            if conn is not None:
+                stats['disk_entries'] = conn.execute(
+                    'SELECT COUNT(*) FROM analyses'
+                ).fetchone()[0]
+            return stats
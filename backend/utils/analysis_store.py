@@ -0,0 +1,222 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Largest page of search results
+MAX_SEARCH_LIMIT = 500
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query that matches clauses containing every
+    word, so user input never hits FTS5 syntax (quotes, operators, colons)
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def parse_time(value: str) -> float:
+    """
+    A timestamp from an ISO date or date-time (local time unless it carries
+    an offset), or from seconds since the epoch
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+class AnalysisStore:
+    """
+    Persistent store of analysed documents and their classified clauses,
+    searchable across contracts. Clause type, risk level and document are
+    indexed columns; clause text is indexed by an external-content FTS5
+    table, so it is stored only once. Each document content (digest) keeps
+    only its latest analysis: re-analysing it with other rules replaces its
+    clauses.
+
+    Results come newest first and pages are keyed by clause id, so deep
+    pages cost the same as the first one.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA foreign_keys=ON')
+            self._conn.executescript(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                ' id INTEGER PRIMARY KEY,'
+                ' digest TEXT NOT NULL UNIQUE,'
+                ' analysis_id TEXT NOT NULL,'
+                ' filename TEXT,'
+                ' rule_pack TEXT,'
+                ' clause_count INTEGER NOT NULL,'
+                ' analyzed_at REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS idx_documents_analyzed_at ON documents (analyzed_at);'
+                'CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents (filename);'
+                'CREATE TABLE IF NOT EXISTS clauses ('
+                ' id INTEGER PRIMARY KEY,'
+                ' document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,'
+                ' clause_index INTEGER NOT NULL,'
+                ' type TEXT NOT NULL,'
+                ' risk_level TEXT NOT NULL,'
+                ' text TEXT NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS idx_clauses_document ON clauses (document_id);'
+                'CREATE INDEX IF NOT EXISTS idx_clauses_type ON clauses (type);'
+                'CREATE INDEX IF NOT EXISTS idx_clauses_risk ON clauses (risk_level);'
+                'CREATE INDEX IF NOT EXISTS idx_clauses_type_risk ON clauses (type, risk_level);'
+                "CREATE VIRTUAL TABLE IF NOT EXISTS clause_fts USING fts5("
+                " text, content='clauses', content_rowid='id', tokenize='porter unicode61');"
+                'CREATE TRIGGER IF NOT EXISTS clauses_fts_insert AFTER INSERT ON clauses BEGIN'
+                ' INSERT INTO clause_fts (rowid, text) VALUES (new.id, new.text); END;'
+                'CREATE TRIGGER IF NOT EXISTS clauses_fts_delete AFTER DELETE ON clauses BEGIN'
+                " INSERT INTO clause_fts (clause_fts, rowid, text) VALUES ('delete', old.id, old.text); END;"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def add(self, analysis_id: str, filename: Optional[str], result: Dict,
+            analyzed_at: Optional[float] = None) -> bool:
+        """
+        Store a successful analysis. Returns False when this exact analysis
+        is already stored.
+        """
+        if result.get('status') != 'success':
+            return False
+        digest = analysis_id.split(':', 1)[0]
+        rows = [
+            (index, clause['type'], clause['risk_level'], clause['text'])
+            for index, clause in enumerate(result['clauses'])
+        ]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                existing = conn.execute(
+                    'SELECT id, analysis_id FROM documents WHERE digest = ?', (digest,)
+                ).fetchone()
+                if existing is not None:
+                    if existing[1] == analysis_id:
+                        return False
+                    # Clauses go with their document
+                    conn.execute('DELETE FROM documents WHERE id = ?', (existing[0],))
+                document_id = conn.execute(
+                    'INSERT INTO documents (digest, analysis_id, filename, rule_pack, clause_count, analyzed_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (digest, analysis_id, filename, result.get('rule_pack'), len(rows),
+                     analyzed_at if analyzed_at is not None else time.time())
+                ).lastrowid
+                conn.executemany(
+                    'INSERT INTO clauses (document_id, clause_index, type, risk_level, text) VALUES (?, ?, ?, ?, ?)',
+                    [(document_id,) + row for row in rows]
+                )
+        return True
+
+    def search(self, query: Optional[str] = None, clause_type: Optional[str] = None,
+               risk_level: Optional[str] = None, document: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 50, before_id: Optional[int] = None) -> Dict:
+        """
+        Clauses matching every given filter, newest first: ``query`` is full
+        text (all words, stemmed), ``document`` a substring of the file
+        name, ``since``/``until`` bound the analysis time. Pass the returned
+        ``next_before_id`` as ``before_id`` for the next page.
+        """
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        where: List[str] = []
+        params: List = []
+        if query and query.strip():
+            source = 'clause_fts JOIN clauses c ON c.id = clause_fts.rowid'
+            # Ordering and paging on the FTS rowid lets SQLite walk the
+            # matches newest first and stop after one page
+            key = 'clause_fts.rowid'
+            where.append('clause_fts MATCH ?')
+            params.append(fts_query(query))
+        else:
+            source = 'clauses c'
+            key = 'c.id'
+        if clause_type:
+            where.append('c.type = ?')
+            params.append(clause_type)
+        if risk_level:
+            where.append('c.risk_level = ?')
+            params.append(risk_level)
+
+        document_filters: List[str] = []
+        if document:
+            document_filters.append("filename LIKE ? ESCAPE '\\'")
+            escaped = document.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if since is not None:
+            document_filters.append('analyzed_at >= ?')
+            params.append(since)
+        if until is not None:
+            document_filters.append('analyzed_at < ?')
+            params.append(until)
+        if document_filters:
+            where.append(f"c.document_id IN (SELECT id FROM documents WHERE {' AND '.join(document_filters)})")
+
+        if before_id is not None:
+            where.append(f'{key} < ?')
+            params.append(before_id)
+
+        sql = (
+            'SELECT c.id, c.clause_index, c.type, c.risk_level, c.text,'
+            ' d.analysis_id, d.filename, d.analyzed_at'
+            f' FROM {source} JOIN documents d ON d.id = c.document_id'
+            f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+            f' ORDER BY {key} DESC LIMIT ?'
+        )
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+
+        clauses = [
+            {
+                'id': row[0],
+                'clause_index': row[1],
+                'type': row[2],
+                'risk_level': row[3],
+                'text': row[4],
+                'analysis_id': row[5],
+                'document': row[6],
+                'analyzed_at': row[7],
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            'clauses': clauses,
+            'next_before_id': clauses[-1]['id'] if len(rows) > limit else None,
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            documents = conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+            clauses = conn.execute('SELECT COUNT(*) FROM clauses').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'documents': documents,
+            'clauses': clauses,
+            'bytes': page_count * page_size,
+        }
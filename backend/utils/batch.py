@@ -0,0 +1,167 @@
+import io
+import logging
+import os
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for one batch request
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 200))
+BATCH_MAX_UNCOMPRESSED = int(os.environ.get('BATCH_MAX_UNCOMPRESSED', 512 * 1024 * 1024))
+
+
+class BatchItem(NamedTuple):
+    filename: str
+    content: bytes
+
+
+class BatchError(Exception):
+    """Raised when a batch as a whole is rejected"""
+
+
+def expand_archive(filename: str, content: bytes, allowed: Callable[[str], bool]) -> List[BatchItem]:
+    """
+    Return the supported documents inside a ZIP archive. Directories,
+    macOS resource forks and unsupported extensions are skipped.
+    """
+    items = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and allowed(os.path.basename(info.filename))
+            ]
+            if sum(info.file_size for info in members) > BATCH_MAX_UNCOMPRESSED:
+                raise BatchError(f'{filename} expands beyond {BATCH_MAX_UNCOMPRESSED} bytes')
+            for info in members:
+                items.append(BatchItem(info.filename, archive.read(info)))
+    except zipfile.BadZipFile:
+        raise BatchError(f'{filename} is not a valid ZIP archive')
+    return items
+
+
+def collect_items(files, allowed: Callable[[str], bool]) -> List[BatchItem]:
+    """
+    Flatten uploaded files, expanding ZIP archives into their documents
+    """
+    items = []
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            items.extend(expand_archive(file.filename, file.read(), allowed))
+        elif allowed(file.filename):
+            items.append(BatchItem(file.filename, file.read()))
+        else:
+            raise BatchError(f'Invalid file type: {file.filename}')
+        if len(items) > BATCH_MAX_FILES:
+            raise BatchError(f'Too many documents in batch (limit {BATCH_MAX_FILES})')
+    if not items:
+        raise BatchError('No supported documents in batch')
+    return items
+
+
+def summarize_batch(documents: List[Dict]) -> Dict:
+    """
+    Aggregate clause types and risk levels across all successful documents
+    """
+    type_counts = Counter()
+    risk_counts = Counter()
+    high_risk = []
+    for document in documents:
+        if document['status'] != 'success':
+            continue
+        document_risks = Counter(clause['risk_level'] for clause in document['clauses'])
+        type_counts.update(clause['type'] for clause in document['clauses'])
+        risk_counts.update(document_risks)
+        if document_risks.get('High'):
+            high_risk.append({'filename': document['filename'], 'high_risk_clauses': document_risks['High']})
+
+    high_risk.sort(key=lambda entry: entry['high_risk_clauses'], reverse=True)
+    succeeded = sum(1 for document in documents if document['status'] == 'success')
+    return {
+        'documents': len(documents),
+        'succeeded': succeeded,
+        'failed': len(documents) - succeeded,
+        'clause_count': sum(type_counts.values()),
+        'type_counts': dict(type_counts),
+        'risk_counts': dict(risk_counts),
+        'high_risk_documents': high_risk
+    }
+
+
+def run_batch(items: List[BatchItem], work_dir: str, executor: Executor,
+              cache=None, ruleset_version: Optional[str] = None) -> Dict:
+    """
+    Analyse every item on ``executor`` and return per-document results in
+    upload order plus an aggregate summary. A failing document is reported
+    in place and does not abort the rest of the batch.
+    """
+    from utils.analysis_cache import content_key
+    from utils.pipeline import process_file
+
+    start_time = time.time()
+    os.makedirs(work_dir, exist_ok=True)
+    documents: List[Optional[Dict]] = [None] * len(items)
+    pending = {}
+    paths = []
+
+    try:
+        for index, item in enumerate(items):
+            key = content_key(item.content, ruleset_version) if cache is not None else None
+            cached = cache.get(key) if key else None
+            if cached is not None:
+                documents[index] = dict(cached, filename=item.filename, analysis_id=key, cached=True)
+                continue
+
+            # Index prefix keeps same-named members of different folders apart
+            name = secure_filename(os.path.basename(item.filename)) or 'document'
+            file_path = os.path.join(work_dir, f'{index}_{name}')
+            with open(file_path, 'wb') as f:
+                f.write(item.content)
+            paths.append(file_path)
+            pending[index] = (key, executor.submit(process_file, file_path))
+
+        for index, (key, future) in pending.items():
+            filename = items[index].filename
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Batch document {filename} crashed: {str(e)}")
+                result = {'status': 'error', 'message': f'Error processing file: {str(e)}', 'clauses': []}
+            if key and result['status'] == 'success':
+                cache.put(key, result)
+            documents[index] = dict(result, filename=filename, analysis_id=key, cached=False)
+    finally:
+        for file_path in paths:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        try:
+            os.rmdir(work_dir)
+        except OSError:
+            pass
+
+    summary = summarize_batch(documents)
+    if summary['failed'] == 0:
+        status = 'success'
+    elif summary['succeeded'] == 0:
+        status = 'error'
+    else:
+        status = 'partial'
+
+    elapsed = time.time() - start_time
+    logger.info(f"Batch of {len(items)} documents finished in {elapsed:.2f}s ({status})")
+    return {
+        'status': status,
+        'documents': documents,
+        'summary': summary,
+        'elapsed': round(elapsed, 3)
+    }
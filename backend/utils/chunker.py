@@ -1,66 +1,129 @@
+import os
 import re
-import nltk
-from nltk.tokenize import sent_tokenize
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Download required NLTK data
-def ensure_nltk_data():
+# NLTK packages and where each one lives inside an nltk_data directory
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'wordnet': 'corpora/wordnet',
+    'stopwords': 'corpora/stopwords',
+}
+
+# Local bundle populated by download_nltk_data.py
+NLTK_DATA_DIR = os.environ.get(
+    'NLTK_DATA',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nltk_data')
+).split(os.pathsep)[0]
+
+def ensure_nltk_data(download=False):
     """
-    Ensure all required NLTK data is downloaded
+    Check that all required NLTK data is present in the local bundle and
+    return the missing package names. This only looks at the filesystem, so
+    it neither imports NLTK nor touches the network; missing packages are
+    downloaded into the bundle only when ``download`` is set.
     """
-    required_packages = ['punkt', 'averaged_perceptron_tagger', 'wordnet', 'stopwords']
-    for package in required_packages:
-        try:
-            nltk.data.find(f'tokenizers/{package}')
-        except LookupError:
+    missing = [
+        package for package, resource in NLTK_RESOURCES.items()
+        if not (os.path.exists(os.path.join(NLTK_DATA_DIR, resource))
+                or os.path.exists(os.path.join(NLTK_DATA_DIR, resource + '.zip')))
+    ]
+    if missing and download:
+        import nltk
+        for package in missing:
             logger.info(f"Downloading NLTK package: {package}")
-            nltk.download(package, quiet=True)
+            nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+        return ensure_nltk_data(download=False)
+    return missing
+
+# Common clause markers; a clause ends with the marker that follows it
+CLAUSE_MARKERS = [
+    r'\d+\.\s',  # Numbered clauses (e.g., "1. ")
+    r'\([a-z]\)\s',  # Lettered subclauses (e.g., "(a) ")
+    r'WHEREAS\s',  # Whereas clauses
+    r'THEREFORE\s',  # Therefore clauses
+    r'IN WITNESS WHEREOF\s',  # Witness clauses
+    r'IN CONSIDERATION OF\s',  # Consideration clauses
+    r'THE PARTIES AGREE AS FOLLOWS:\s',  # Agreement clauses
+]
+CLAUSE_PATTERN = re.compile('|'.join(CLAUSE_MARKERS))
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Longer than the longest fixed-width marker ("THE PARTIES AGREE AS FOLLOWS: "),
+# so a marker starting before this distance from the end of the buffer cannot
+# change once more text arrives
+MARKER_LOOKAHEAD = 32
+
+def iter_clauses(chunks):
+    """
+    Split an iterable of text chunks (e.g. pages) into clauses incrementally.
+
+    Produces exactly what split_into_clauses returns for the concatenated
+    text, but only keeps the text after the last accepted clause marker in
+    memory. Markers near the end of the buffered text are held back until
+    enough of the next chunk has arrived, so markers straddling a chunk
+    boundary are handled.
+    """
+    buffer = ''
+    rescan = 0
+    emitted = False
+
+    for chunk in chunks:
+        chunk = WHITESPACE_PATTERN.sub(' ', chunk)
+        if not buffer:
+            if not emitted:
+                chunk = chunk.lstrip()
+        elif buffer[-1] == ' ' and chunk[:1] == ' ':
+            chunk = chunk[1:]
+        if not chunk:
+            continue
+        buffer += chunk
+
+        pos = 0
+        safe = len(buffer) - MARKER_LOOKAHEAD
+        stopped_at = None
+        for match in CLAUSE_PATTERN.finditer(buffer, rescan):
+            if match.start() >= safe or match.end() >= len(buffer):
+                stopped_at = match.start()
+                break
+            clause = (buffer[pos:match.start()] + match.group()).strip()
+            if clause:
+                emitted = True
+                yield clause
+            pos = match.end()
 
-# Download NLTK data on module import
-ensure_nltk_data()
+        # Nothing can start a marker between pos and rescan with the text
+        # seen so far, except a number that is still being continued
+        rescan = max(pos, safe)
+        if stopped_at is not None:
+            rescan = min(rescan, stopped_at)
+        while rescan > pos and buffer[rescan - 1].isdigit():
+            rescan -= 1
+        buffer = buffer[pos:]
+        rescan -= pos
+
+    buffer = buffer.rstrip()
+    pos = 0
+    for match in CLAUSE_PATTERN.finditer(buffer, rescan):
+        clause = (buffer[pos:match.start()] + match.group()).strip()
+        if clause:
+            emitted = True
+            yield clause
+        pos = match.end()
+
+    # If no clauses were found, the whole text is one clause
+    if not emitted:
+        yield buffer
 
 def split_into_clauses(text):
     """
     Split text into clauses based on common legal document patterns
     """
     try:
-        # Remove extra whitespace and normalize line endings
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        # Split on common clause markers
-        # This is a simple implementation - you might want to make it more sophisticated
-        clause_markers = [
-            r'\d+\.\s',  # Numbered clauses (e.g., "1. ")
-            r'\([a-z]\)\s',  # Lettered subclauses (e.g., "(a) ")
-            r'WHEREAS\s',  # Whereas clauses
-            r'THEREFORE\s',  # Therefore clauses
-            r'IN WITNESS WHEREOF\s',  # Witness clauses
-            r'IN CONSIDERATION OF\s',  # Consideration clauses
-            r'THE PARTIES AGREE AS FOLLOWS:\s',  # Agreement clauses
-        ]
-        
-        # Create pattern for splitting
-        pattern = '|'.join(clause_markers)
-        
-        # Split text into clauses
-        clauses = re.split(f'({pattern})', text)
-        
-        # Combine markers with their clauses and filter out empty strings
-        result = []
-        for i in range(0, len(clauses)-1, 2):
-            if i+1 < len(clauses):
-                clause = (clauses[i] + clauses[i+1]).strip()
-                if clause:
-                    result.append(clause)
-        
-        # If no clauses were found, return the whole text as one clause
-        if not result:
-            result = [text]
-        
+        result = list(iter_clauses([text]))
         logger.info(f"Split text into {len(result)} clauses")
         return result
         
@@ -1,8 +1,62 @@
+import hashlib
+import json
 import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from models.rule_pack import RuleSet, active_rules
+from utils.clause_memo import CLAUSE_MEMO, normalize_clause
+
+
+def _leading_literal(pattern: str) -> Optional[str]:
+    """
+    The character every match of ``pattern`` starts with, when the pattern
+    plainly begins with a letter, digit or space that is not optional and
+    has no top-level alternation; None otherwise
+    """
+    if not pattern or not (pattern[0].isalnum() or pattern[0] == ' '):
+        return None
+    if len(pattern) > 1 and pattern[1] in '?*{':
+        return None
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 1
+        elif char == '[':
+            # Skip the class; ']' right after '[' or '[^' is literal
+            index += 2 if pattern[index + 1:index + 2] == '^' else 1
+            if pattern[index:index + 1] == ']':
+                index += 1
+            while index < len(pattern) and pattern[index] != ']':
+                index += 2 if pattern[index] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return None
+        index += 1
+    return pattern[0]
+
+
+def _start_gate(patterns: List[str]) -> str:
+    """
+    A lookahead on the literal first characters of the patterns, so a scan
+    skips ahead quickly to where one of them could start; empty when some
+    pattern does not start with a plain literal
+    """
+    chars = set()
+    for pattern in patterns:
+        first = _leading_literal(pattern)
+        if first is None:
+            return ''
+        chars.add(first)
+    return '(?=[' + ''.join(re.escape(char) for char in sorted(chars)) + '])'
+
 
 class RuleBasedClassifier:
-    def __init__(self):
+    def __init__(self, rules: Optional[RuleSet] = None):
         # Define risk levels and their descriptions
         self.risk_levels = {
             'high': 'Significant potential impact on business operations or legal obligations',
@@ -10,155 +64,80 @@ class RuleBasedClassifier:
             'low': 'Minimal impact or standard industry practice'
         }
         
-        # Define clause patterns with their risk levels and specific concerns
-        self.clause_patterns = {
-            'confidentiality': {
-                'patterns': [
-                    r'confidential(?:ity)?',
-                    r'non-disclosure',
-                    r'nda',
-                    r'proprietary information',
-                    r'trade secret'
-                ],
-                'risk_level': 'high',
-                'specific_concerns': [
-                    'Data protection requirements',
-                    'Information sharing restrictions',
-                    'Security measures needed',
-                    'Potential breach consequences'
-                ]
-            },
-            'termination': {
-                'patterns': [
-                    r'terminat(?:ion|e)',
-                    r'end of agreement',
-                    r'cancellation',
-                    r'expiration'
-                ],
-                'risk_level': 'high',
-                'specific_concerns': [
-                    'Early termination penalties',
-                    'Notice period requirements',
-                    'Post-termination obligations',
-                    'Transition requirements'
-                ]
-            },
-            'payment': {
-                'patterns': [
-                    r'payment',
-                    r'invoice',
-                    r'fee',
-                    r'price',
-                    r'cost',
-                    r'payment terms'
-                ],
-                'risk_level': 'medium',
-                'specific_concerns': [
-                    'Payment schedule',
-                    'Late payment penalties',
-                    'Currency and exchange rates',
-                    'Tax implications'
-                ]
-            },
-            'liability': {
-                'patterns': [
-                    r'liability',
-                    r'indemnification',
-                    r'warranty',
-                    r'guarantee',
-                    r'hold harmless'
-                ],
-                'risk_level': 'high',
-                'specific_concerns': [
-                    'Financial exposure limits',
-                    'Insurance requirements',
-                    'Exclusion clauses',
-                    'Third-party claims'
-                ]
-            },
-            'intellectual_property': {
-                'patterns': [
-                    r'intellectual property',
-                    r'ip',
-                    r'copyright',
-                    r'patent',
-                    r'trademark',
-                    r'license'
-                ],
-                'risk_level': 'high',
-                'specific_concerns': [
-                    'IP ownership rights',
-                    'Usage restrictions',
-                    'Infringement risks',
-                    'Licensing terms'
-                ]
-            },
-            'governance': {
-                'patterns': [
-                    r'govern(?:ance|ing) law',
-                    r'jurisdiction',
-                    r'dispute resolution',
-                    r'arbitration',
-                    r'mediation'
-                ],
-                'risk_level': 'medium',
-                'specific_concerns': [
-                    'Legal jurisdiction',
-                    'Dispute resolution process',
-                    'Compliance requirements',
-                    'Regulatory framework'
-                ]
-            },
-            'service_level': {
-                'patterns': [
-                    r'service level',
-                    r'sla',
-                    r'performance',
-                    r'uptime',
-                    r'availability'
-                ],
-                'risk_level': 'medium',
-                'specific_concerns': [
-                    'Performance metrics',
-                    'Service availability',
-                    'Response time requirements',
-                    'Penalty clauses'
-                ]
-            },
-            'data_protection': {
-                'patterns': [
-                    r'data protection',
-                    r'privacy',
-                    r'gdpr',
-                    r'personal data',
-                    r'data security'
-                ],
-                'risk_level': 'high',
-                'specific_concerns': [
-                    'Data handling requirements',
-                    'Privacy compliance',
-                    'Security measures',
-                    'Data breach procedures'
-                ]
-            }
-        }
+        # Clause patterns with their risk levels and specific concerns come
+        # from the rule pack
+        self.rules = rules or active_rules()
+        self.clause_patterns = self.rules.patterns
+        self._compile()
 
-    def classify_clause(self, text: str) -> Dict:
+    def _compile(self):
         """
-        Classify a clause and provide detailed risk analysis.
+        Compile every pattern into one scanner and precompute per-type
+        descriptions.
+
+        Each distinct pattern becomes a named group inside an optional
+        lookahead, so a single ``finditer`` pass over the clause records
+        every pattern that matches at each position without consuming text.
+        Overlapping hits ('payment' inside 'payment terms') are therefore
+        all seen, just as separate searches would see them. Leading
+        lookaheads on the patterns' first characters and on the plain
+        alternation only let the scan stop where some pattern matches.
+        Patterns with their own groups could clash with the numbering, so
+        those are still searched on their own.
         """
-        text = text.lower()
+        patterns = list(dict.fromkeys(
+            pattern for info in self.clause_patterns.values() for pattern in info['patterns']
+        ))
+        combined = [pattern for pattern in patterns if re.compile(pattern).groups == 0]
+        self._pattern_groups = {f'p{index}': pattern for index, pattern in enumerate(combined)}
+        self._scanner = None
+        if combined:
+            self._scanner = re.compile(
+                _start_gate(combined) + '(?=' + '|'.join(f'(?:{pattern})' for pattern in combined) + ')'
+                + ''.join(f'(?:(?=(?P<{name}>{pattern})))?' for name, pattern in self._pattern_groups.items())
+            ).finditer
+        self._searches = tuple(
+            (pattern, re.compile(pattern).search) for pattern in patterns if pattern not in combined
+        )
+        self._compiled = tuple(
+            (clause_type, tuple(info['patterns'])) for clause_type, info in self.clause_patterns.items()
+        )
+
+        # Descriptions only depend on the clause type, so build them once
+        self._descriptions = {}
+        for clause_type, info in self.clause_patterns.items():
+            description = f"This {clause_type.replace('_', ' ')} clause has {info['risk_level']} risk level. "
+            description += f"It requires attention to: {', '.join(info['specific_concerns'][:2])}."
+            self._descriptions[clause_type] = description
+
+        # Memo namespace; changes whenever the pattern table does
+        payload = json.dumps(self.clause_patterns, sort_keys=True)
+        self.ruleset_version = 'patterns-' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _classify_lowered(self, text: str) -> Dict:
+        """
+        Classify an already-lowercased clause. All patterns are matched in
+        one pass over the text; the matches of the winning type are kept
+        from that pass.
+        """
+        found = set()
+        if self._scanner is not None:
+            groups = self._pattern_groups
+            for match in self._scanner(text):
+                found.update(groups[name] for name, value in match.groupdict().items() if value is not None)
+        found.update(pattern for pattern, search in self._searches if search(text))
+
         max_matches = 0
         best_match = None
         matched_patterns = []
 
         # Find the best matching clause type
-        for clause_type, info in self.clause_patterns.items():
-            matches = sum(1 for pattern in info['patterns'] if re.search(pattern, text))
-            if matches > max_matches:
-                max_matches = matches
+        for clause_type, patterns in self._compiled:
+            matched = [pattern for pattern in patterns if pattern in found]
+            if len(matched) > max_matches:
+                max_matches = len(matched)
                 best_match = clause_type
-                matched_patterns = [p for p in info['patterns'] if re.search(p, text)]
+                matched_patterns = matched
 
         if not best_match:
             return {
@@ -171,21 +150,40 @@ class RuleBasedClassifier:
 
         # Get the risk information for the matched clause type
         risk_info = self.clause_patterns[best_match]
-        
-        # Generate a detailed risk description
-        risk_description = f"This {best_match.replace('_', ' ')} clause has {risk_info['risk_level']} risk level. "
-        risk_description += f"It requires attention to: {', '.join(risk_info['specific_concerns'][:2])}."
 
         return {
             'type': best_match,
             'risk_level': risk_info['risk_level'],
-            'risk_description': risk_description,
+            'risk_description': self._descriptions[best_match],
             'specific_concerns': risk_info['specific_concerns'],
             'matched_patterns': matched_patterns
         }
 
+    def classify_clause(self, text: str) -> Dict:
+        """
+        Classify a clause and provide detailed risk analysis.
+        Patterns are matched against the normalized clause, lowercased with
+        whitespace runs collapsed, which is also the memo key; so a
+        multi-word pattern such as 'end of agreement' matches across a line
+        break. Results are memoized across documents by normalized text.
+        """
+        result = CLAUSE_MEMO.get_or_compute(self.ruleset_version, normalize_clause(text), self._classify_lowered)
+        return dict(result, matched_patterns=list(result['matched_patterns']))
+
     def analyze_contract(self, clauses: List[str]) -> List[Dict]:
         """
         Analyze a list of clauses and return detailed risk analysis for each.
+        Identical clauses within the batch are looked up and classified only
+        once; the rest come from the clause memo when it has them.
         """
-        return [self.classify_clause(clause) for clause in clauses] 
\ No newline at end of file
+        seen = {}
+        results = []
+        for clause in clauses:
+            normalized = normalize_clause(clause)
+            result = seen.get(normalized)
+            if result is None:
+                result = seen[normalized] = CLAUSE_MEMO.get_or_compute(
+                    self.ruleset_version, normalized, self._classify_lowered
+                )
+            results.append(dict(result, matched_patterns=list(result['matched_patterns'])))
+        return results
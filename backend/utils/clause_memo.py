@@ -0,0 +1,208 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Clause classifications kept in memory per process
+CLAUSE_MEMO_SIZE = int(os.environ.get('CLAUSE_MEMO_SIZE', 50000))
+# Optional SQLite file that keeps the memo across restarts
+CLAUSE_MEMO_PATH = os.environ.get('CLAUSE_MEMO_PATH') or None
+# Pending entries written to SQLite in one transaction
+FLUSH_EVERY = 256
+
+
+def normalize_clause(text: str) -> str:
+    """
+    Lowercase a clause and collapse whitespace runs, so copies of the same
+    boilerplate that differ only in layout share one memo entry
+    """
+    return ' '.join(text.lower().split())
+
+
+def _digest(normalized: str) -> bytes:
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+def _footprint(key: Tuple[str, bytes], value: Any) -> int:
+    """Approximate bytes held by one entry"""
+    size = sys.getsizeof(key) + sys.getsizeof(key[1])
+    size += sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class ClauseMemo:
+    """
+    Bounded, thread-safe LRU of clause classifications keyed by a digest of
+    the normalized clause text and the version of the rules that produced
+    the value, so boilerplate shared across documents is classified once
+    per ruleset. Values must be JSON-serializable when ``db_path`` is set;
+    new entries are then written behind in batches by a background thread,
+    off the request path, and the most recently used ones are loaded back
+    on start.
+    """
+
+    def __init__(self, max_entries: int = CLAUSE_MEMO_SIZE, db_path: Optional[str] = CLAUSE_MEMO_PATH):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries: 'OrderedDict[Tuple[str, bytes], Any]' = OrderedDict()
+        self._sizes: Dict[Tuple[str, bytes], int] = {}
+        self._bytes = 0
+        self._pending: List[Tuple[str, bytes, str]] = []
+        self._lock = threading.Lock()
+        # Serializes SQLite writes, which happen outside the memo lock
+        self._db_lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._flusher = None
+        self._flusher_pid = None
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'loaded': 0}
+        self._conn = None
+        self._conn_pid = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._load()
+            atexit.register(self.flush)
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS clause_memo ('
+                ' version TEXT NOT NULL,'
+                ' digest BLOB NOT NULL,'
+                ' value TEXT NOT NULL,'
+                ' used_at REAL NOT NULL,'
+                ' PRIMARY KEY (version, digest))'
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self) -> None:
+        rows = self._connection().execute(
+            'SELECT version, digest, value FROM clause_memo ORDER BY used_at DESC LIMIT ?',
+            (self.max_entries,)
+        ).fetchall()
+        # Oldest first, so the most recently used rows end up at the LRU tail
+        for version, digest, value in reversed(rows):
+            self._store((version, bytes(digest)), json.loads(value))
+        self._counters['loaded'] = len(rows)
+        logger.info(f"Loaded {len(rows)} memoized clauses from {self.db_path}")
+
+    def _store(self, key: Tuple[str, bytes], value: Any) -> None:
+        if key in self._entries:
+            self._bytes -= self._sizes[key]
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = _footprint(key, value)
+        self._bytes += self._sizes[key]
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_key)
+            self._counters['evictions'] += 1
+
+    def get(self, version: str, normalized: str) -> Optional[Any]:
+        key = (version, _digest(normalized))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def put(self, version: str, normalized: str, value: Any) -> None:
+        key = (version, _digest(normalized))
+        with self._lock:
+            self._store(key, value)
+            if self.db_path:
+                self._pending.append((version, key[1], json.dumps(value)))
+                if len(self._pending) >= FLUSH_EVERY:
+                    self._wake_flusher()
+
+    def _wake_flusher(self) -> None:
+        # Threads do not survive a fork, so each process starts its own
+        if self._flusher is None or self._flusher_pid != os.getpid():
+            self._flusher = threading.Thread(target=self._flush_loop, name='clause-memo-flush', daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+        self._flush_wanted.set()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_wanted.wait()
+            self._flush_wanted.clear()
+            self.flush()
+
+    def get_or_compute(self, version: str, normalized: str, compute: Callable[[str], Any]) -> Any:
+        """
+        Return the memoized value for a normalized clause, computing and
+        storing it on a miss
+        """
+        value = self.get(version, normalized)
+        if value is None:
+            value = compute(normalized)
+            self.put(version, normalized, value)
+        return value
+
+    def flush(self) -> None:
+        """Write pending entries to the persistent store"""
+        if not self.db_path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        now = time.time()
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO clause_memo (version, digest, value, used_at) VALUES (?, ?, ?, ?)',
+                    [(version, digest, value, now) for version, digest, value in pending]
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist clause memo: {str(e)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self._pending = []
+            if self.db_path:
+                with self._db_lock:
+                    conn = self._connection()
+                    conn.execute('DELETE FROM clause_memo')
+                    conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['approx_bytes'] = self._bytes
+            stats['persistent'] = bool(self.db_path)
+            return stats
+
+
+# Shared by every classifier in the process
+CLAUSE_MEMO = ClauseMemo()
@@ -0,0 +1,81 @@
+import re
+import logging
+from typing import Dict, List, Optional
+
+from utils.chunker import CLAUSE_MARKERS
+
+logger = logging.getLogger(__name__)
+
+# The chunker markers, matched against raw (unnormalized) text: the spaces
+# inside multi-word markers may be any run of whitespace
+RAW_CLAUSE_PATTERN = re.compile('|'.join(marker.replace(' ', r'\s+') for marker in CLAUSE_MARKERS))
+
+
+class ClauseSpan:
+    """
+    A clause as offsets into the document buffer plus its classification ids
+    """
+    __slots__ = ('start', 'end', 'type_id', 'risk_id')
+
+    def __init__(self, start: int, end: int, type_id: int = -1, risk_id: int = -1):
+        self.start = start
+        self.end = end
+        self.type_id = type_id
+        self.risk_id = risk_id
+
+    def __repr__(self):
+        return f"ClauseSpan({self.start}, {self.end}, {self.type_id}, {self.risk_id})"
+
+
+class DocumentBuffer:
+    """
+    The extracted text of one document, its lowercased copy (computed once)
+    and the clause spans over it. Clause text is only materialized when a
+    clause is serialized.
+    """
+    __slots__ = ('text', 'lower', 'spans')
+
+    def __init__(self, text: str):
+        self.text = text
+        lower = text.lower()
+        # A few characters change length when lowercased; offsets into such
+        # a copy would not line up, so clauses get lowercased one by one
+        self.lower: Optional[str] = lower if len(lower) == len(text) else None
+        self.spans: List[ClauseSpan] = split_into_spans(text)
+
+    def clause_text(self, span: ClauseSpan) -> str:
+        """
+        Return the whitespace-normalized text of a clause, as split_into_clauses would
+        """
+        return ' '.join(self.text[span.start:span.end].split())
+
+
+def _trim(text: str, start: int, end: int):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def split_into_spans(text: str) -> List[ClauseSpan]:
+    """
+    Split raw text into clause spans without copying it. The spans cover the
+    same clauses split_into_clauses returns for ``text``, trimmed of
+    surrounding whitespace, with offsets into ``text`` itself.
+    """
+    # split_into_clauses strips the document first, so a marker needs its
+    # trailing whitespace character before the stripped end
+    begin, finish = _trim(text, 0, len(text))
+    spans = []
+    pos = begin
+    for match in RAW_CLAUSE_PATTERN.finditer(text, begin, finish):
+        start, end = _trim(text, pos, match.end())
+        if start < end:
+            spans.append(ClauseSpan(start, end))
+        pos = match.end()
+
+    # If no clauses were found, the whole text is one clause
+    if not spans:
+        spans.append(ClauseSpan(begin, finish))
+    return spans
@@ -1,17 +1,112 @@
+import io
 import os
+import sys
+import math
+import mmap
+import time
 import logging
-from PyPDF2 import PdfReader
-import docx
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 import traceback
 
+from utils.parser_engines import PageExtractor, record_engine_stats
+
 logger = logging.getLogger(__name__)
 
+# PDFs with at least this many pages are extracted page-parallel when
+# parse_pdf or iter_document decide on their own. Off unless
+# PDF_PARALLEL_MIN_PAGES is set: each such document forks a process pool,
+# which an HTTP worker serving threads should not do on every request.
+# Callers can still pass parallel=True or use extract_pdf_pages directly.
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 0)) or sys.maxsize
+
+class PageResult(NamedTuple):
+    page_number: int
+    text: str
+    elapsed: float
+    error: Optional[str]
+    engine: str = ''
+
+class DocumentSource(NamedTuple):
+    """
+    A document that is already in memory: its original file name (which
+    decides the format), its bytes or a read-only mmap of them, and the
+    on-disk copy when there is one, which page-parallel PDF extraction hands
+    to its workers instead of the bytes.
+    """
+    name: str
+    data: Union[bytes, memoryview, mmap.mmap]
+    path: Optional[str] = None
+
+def source_name(source) -> str:
+    """File name of a path or DocumentSource, for logs and metadata"""
+    return source.name if isinstance(source, DocumentSource) else source
+
+def source_size(source) -> int:
+    return len(source.data) if isinstance(source, DocumentSource) else os.path.getsize(source)
+
+def _extension(source) -> str:
+    return os.path.splitext(source_name(source))[1].lower()
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a buffer such as an mmap, without copying it"""
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def getbuffer(self):
+        return self._view[:]
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+def _stream_opener(source) -> Callable[[], BinaryIO]:
+    """
+    Return a function that opens a fresh seekable binary stream over a
+    path, the bytes of a document or a DocumentSource
+    """
+    data = source.data if isinstance(source, DocumentSource) else source
+    if isinstance(data, str):
+        return lambda: open(data, 'rb')
+    if isinstance(data, bytes):
+        return lambda: io.BytesIO(data)
+    return lambda: io.BufferedReader(_BufferReader(data))
+
+def _extractor(source, file_format) -> PageExtractor:
+    return PageExtractor(_stream_opener(source), file_format)
+
+# Parser engines import PyPDF2, pdfminer and python-docx on first use (or
+# utils.startup.preload does), so importing this module stays cheap
+
 def parse_document(file_path):
     """
-    Extract text from a document file (PDF, DOCX, or TXT)
+    Extract text from a document (PDF, DOCX, or TXT), given as a file path
+    or a DocumentSource
     """
     try:
-        file_extension = os.path.splitext(file_path)[1].lower()
+        file_extension = _extension(file_path)
         
         if file_extension == '.pdf':
             return parse_pdf(file_path)
@@ -27,36 +122,180 @@ def parse_document(file_path):
         logger.error(traceback.format_exc())
         raise
 
-def parse_pdf(file_path):
-    """Extract text from PDF file"""
+def iter_document(file_path):
+    """
+    Yield the text of a document (PDF, DOCX, or TXT) in chunks: pages,
+    paragraphs or fixed-size blocks. The concatenated chunks equal the
+    parse_document output apart from surrounding whitespace, so they can be
+    fed to the streaming clause splitter without building the whole text.
+    """
+    file_extension = _extension(file_path)
+
+    if file_extension == '.pdf':
+        if count_pdf_pages(file_path) >= PARALLEL_MIN_PAGES:
+            for page in iter_pdf_pages(file_path):
+                yield page.text + "\n"
+        else:
+            for page in _iter_pdf_pages_serial(file_path):
+                yield page.text + "\n"
+    elif file_extension in ('.docx', '.txt'):
+        # Paragraphs or blocks of decoded text, as the engine produces them
+        with _extractor(file_path, file_extension[1:]) as extractor:
+            try:
+                yield from extractor.iter_page(0)
+            finally:
+                extractor.record()
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+def parse_pdf(file_path, parallel=None, workers=None):
+    """
+    Extract text from PDF file. With ``parallel`` True (or, by default,
+    documents of at least PARALLEL_MIN_PAGES pages when that is enabled)
+    pages are extracted across a process pool.
+    Pages come from the fastest engine, falling back to a higher-fidelity
+    one where it returns empty or garbled text (see utils.parser_engines).
+    """
     try:
-        with open(file_path, 'rb') as file:
-            pdf = PdfReader(file)
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+        if parallel is None:
+            parallel = count_pdf_pages(file_path) >= PARALLEL_MIN_PAGES
+        if parallel:
+            text, _ = extract_pdf_pages(file_path, workers=workers)
+            return text
+        return "".join(page.text + "\n" for page in _iter_pdf_pages_serial(file_path)).strip()
     except Exception as e:
         logger.error(f"Error parsing PDF: {str(e)}")
         raise
 
+def count_pdf_pages(file_path):
+    """Return the number of pages in a PDF without extracting any text"""
+    with _extractor(file_path, 'pdf') as extractor:
+        return extractor.page_count()
+
+def _worker_source(source):
+    """
+    What a pool worker needs to reopen a document: its path when it is on
+    disk, otherwise its bytes
+    """
+    if not isinstance(source, DocumentSource):
+        return source
+    return source.path or bytes(source.data)
+
+def _extract_page_batch(file_path, page_numbers) -> Tuple[List[PageResult], Dict]:
+    """
+    Extract the given pages (0-based) of a PDF, given as a path or as its
+    bytes. Runs in a pool worker and returns one result per page plus the
+    engine statistics, which only the parent process records; a failing
+    page is reported instead of raised.
+    """
+    extractor = _extractor(file_path, 'pdf')
+    try:
+        results = list(_extract_pages(extractor, page_numbers))
+    finally:
+        extractor.close()
+    return results, extractor.stats
+
+def _extract_pages(extractor: PageExtractor, page_numbers) -> Iterator[PageResult]:
+    """Extract pages one by one, reporting a failing page instead of raising"""
+    for page_number in page_numbers:
+        start = time.perf_counter()
+        try:
+            text, engine = extractor.extract(page_number)
+            yield PageResult(page_number, text, time.perf_counter() - start, None, engine)
+        except Exception as e:
+            yield PageResult(page_number, '', time.perf_counter() - start, str(e))
+
+def _iter_pdf_pages_serial(file_path) -> Iterator[PageResult]:
+    """
+    Extract a PDF page by page in this process. Like iter_pdf_pages, a page
+    that fails is logged and comes out empty rather than failing the whole
+    document.
+    """
+    with _extractor(file_path, 'pdf') as extractor:
+        for page in _extract_pages(extractor, range(extractor.page_count())):
+            if page.error:
+                logger.warning(f"Failed to extract page {page.page_number + 1} of {source_name(file_path)}: {page.error}")
+            yield page
+        extractor.record()
+
+def iter_pdf_pages(file_path, workers=None, batch_size=None, report=None) -> Iterator[PageResult]:
+    """
+    Extract a PDF page-parallel and yield pages in order as soon as each one
+    (and every page before it) is done, so downstream stages can start
+    before the last page finishes. Pass a dict as ``report`` to receive the
+    page count, per-page timings and failures.
+    """
+    page_count = count_pdf_pages(file_path)
+    workers = max(1, min(workers or os.cpu_count() or 1, page_count or 1))
+    if batch_size is None:
+        # A few batches per worker keeps the pool balanced on uneven pages
+        batch_size = max(1, math.ceil(page_count / (workers * 4)))
+    batches = [list(range(i, min(i + batch_size, page_count))) for i in range(0, page_count, batch_size)]
+    document = _worker_source(file_path)
+
+    if report is not None:
+        report.update({'page_count': page_count, 'pages': [], 'failures': []})
+
+    start = time.perf_counter()
+    finished = {}
+    next_page = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_page_batch, document, batch) for batch in batches]
+        for future in as_completed(futures):
+            pages, stats = future.result()
+            record_engine_stats(stats)
+            for page in pages:
+                finished[page.page_number] = page
+            while next_page in finished:
+                page = finished.pop(next_page)
+                if report is not None:
+                    report['pages'].append({
+                        'page': page.page_number, 'elapsed': round(page.elapsed, 4), 'engine': page.engine
+                    })
+                    if page.error:
+                        report['failures'].append({'page': page.page_number, 'error': page.error})
+                if page.error:
+                    logger.warning(f"Failed to extract page {page.page_number + 1} of {source_name(file_path)}: {page.error}")
+                yield page
+                next_page += 1
+
+    if report is not None:
+        report['elapsed'] = round(time.perf_counter() - start, 4)
+
+def extract_pdf_pages(file_path, workers=None) -> Tuple[str, Dict]:
+    """
+    Extract all pages of a PDF in parallel and reassemble them in order.
+    Returns the text, laid out exactly like the serial parse_pdf output, and
+    the extraction report.
+    """
+    report: Dict = {}
+    text = "".join(
+        page.text + "\n" for page in iter_pdf_pages(file_path, workers=workers, report=report)
+    ).strip()
+    logger.info(
+        f"Extracted {report['page_count']} pages from {source_name(file_path)} in {report['elapsed']:.2f}s "
+        f"({len(report['failures'])} failed)"
+    )
+    return text, report
+
 def parse_docx(file_path):
     """Extract text from DOCX file"""
     try:
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text.strip()
+        with _extractor(file_path, 'docx') as extractor:
+            text = extractor.extract(0)[0].strip()
+            extractor.record()
+        return text
     except Exception as e:
         logger.error(f"Error parsing DOCX: {str(e)}")
         raise
 
 def parse_txt(file_path):
-    """Extract text from TXT file"""
+    """Extract text from TXT file, as UTF-8 or in the encoding chardet detects"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read().strip()
+        with _extractor(file_path, 'txt') as extractor:
+            text = extractor.extract(0)[0].strip()
+            extractor.record()
+        return text
     except Exception as e:
         logger.error(f"Error parsing TXT: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import uuid
+from typing import BinaryIO, Optional
+
+from utils.document_parser import DocumentSource
+from utils.jobs import process_alive
+
+logger = logging.getLogger(__name__)
+
+# Uploads up to this size are parsed straight from memory; larger ones are
+# written once to the upload folder and memory-mapped
+IN_MEMORY_MAX_SIZE = int(os.environ.get('UPLOAD_IN_MEMORY_MAX_SIZE', 8 * 1024 * 1024))
+
+# Bytes copied per read from the request stream
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Spilled uploads carry the id of the process that wrote them: named
+# '<content hash>-<pid>-<random>.<ext>', or '.upload-<pid>-...' while they
+# are still being written
+SPILL_NAME = re.compile(r'^(?:[0-9a-f]{32}|\.upload)-(\d+)-')
+
+
+def content_file_name(digest: str, filename: str) -> str:
+    """
+    Unique on-disk name for an upload: its content hash, the writing
+    process and a random suffix so concurrent uploads of the same bytes
+    never share (or delete) one file, and the original extension, which
+    decides how it is parsed
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{digest[:32]}-{os.getpid()}-{uuid.uuid4().hex[:8]}{extension}"
+
+
+def sweep_spilled_uploads(folder: str) -> int:
+    """
+    Remove the spilled uploads of processes that are gone, which a crash or
+    kill in the middle of a request leaves behind. Files of live processes
+    are still in use and kept. Returns the number of files removed.
+    """
+    removed = 0
+    for name in os.listdir(folder):
+        match = SPILL_NAME.match(name)
+        if match is None or process_alive(int(match.group(1))):
+            continue
+        try:
+            os.remove(os.path.join(folder, name))
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} spilled uploads of stopped processes from {folder}")
+    return removed
+
+
+class IngestedUpload:
+    """
+    An uploaded document read from a request stream in a single pass, with
+    its SHA-256 computed on the way. Small uploads stay in memory; once an
+    upload outgrows ``in_memory_max_size`` it is spilled to a file in
+    ``folder`` named after its content and memory-mapped. ``source`` can be
+    handed to the parser and pipeline in both cases. close() (also called on
+    leaving a ``with`` block) unmaps and removes the file and is safe to
+    call more than once.
+    """
+
+    def __init__(self, stream: BinaryIO, filename: str, folder: str,
+                 in_memory_max_size: int = IN_MEMORY_MAX_SIZE):
+        self.filename = filename
+        self.path: Optional[str] = None
+        self._map: Optional[mmap.mmap] = None
+
+        sha = hashlib.sha256()
+        chunks = []
+        size = 0
+        spill = None
+        tmp_path = None
+        try:
+            for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+                sha.update(chunk)
+                size += len(chunk)
+                if spill is None and size > in_memory_max_size:
+                    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.upload-{os.getpid()}-')
+                    spill = os.fdopen(fd, 'wb')
+                    spill.writelines(chunks)
+                    chunks = []
+                if spill is None:
+                    chunks.append(chunk)
+                else:
+                    spill.write(chunk)
+        except BaseException:
+            if spill is not None:
+                spill.close()
+                os.remove(tmp_path)
+            raise
+
+        self.size = size
+        self.digest = sha.hexdigest()
+        if spill is None:
+            self.data = b''.join(chunks)
+        else:
+            spill.close()
+            self.path = os.path.join(folder, content_file_name(self.digest, filename))
+            os.replace(tmp_path, self.path)
+            with open(self.path, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = self._map
+            logger.info(f"Spilled {size} byte upload {filename} to {self.path}")
+
+    @property
+    def source(self) -> DocumentSource:
+        return DocumentSource(self.filename, self.data, self.path)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self.data = b''
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __enter__(self) -> 'IngestedUpload':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
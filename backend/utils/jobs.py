@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress writes from a worker
+PROGRESS_INTERVAL = 0.25
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Every process (HTTP workers and pool workers)
+    opens its own connection, so status written by a pool worker is visible
+    to whichever HTTP worker serves the status request.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' status TEXT NOT NULL,'
+                ' filename TEXT,'
+                ' file_path TEXT,'
+                ' progress_current INTEGER DEFAULT 0,'
+                ' progress_total INTEGER DEFAULT 0,'
+                ' result TEXT,'
+                ' error TEXT,'
+                ' created_at REAL,'
+                ' started_at REAL,'
+                ' finished_at REAL,'
+                ' owner_pid INTEGER)'
+            )
+            columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+            if 'owner_pid' not in columns:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+            self._conn.commit()
+        return self._conn
+
+    def _execute(self, sql: str, params=()) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(sql, params)
+            conn.commit()
+
+    def create(self, job_id: str, filename: str, file_path: str) -> None:
+        self._execute(
+            'INSERT INTO jobs (id, status, filename, file_path, created_at, owner_pid) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', filename, file_path, time.time(), os.getpid())
+        )
+
+    def mark_running(self, job_id: str) -> None:
+        self._execute(
+            'UPDATE jobs SET status = ?, started_at = ? WHERE id = ?',
+            ('running', time.time(), job_id)
+        )
+
+    def update_progress(self, job_id: str, current: int, total: int) -> None:
+        self._execute(
+            'UPDATE jobs SET progress_current = ?, progress_total = ? WHERE id = ?',
+            (current, total, job_id)
+        )
+
+    def finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        status = 'failed' if error or (result and result.get('status') == 'error') else 'completed'
+        self._execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def fail_orphaned(self, job_id: Optional[str] = None) -> int:
+        """
+        Mark queued or running jobs whose owner process (the one whose pool
+        runs them) is gone as failed, since they would otherwise never
+        finish. Limited to one job when ``job_id`` is given.
+        """
+        scope = ' AND id = ?' if job_id else ''
+        params = (job_id,) if job_id else ()
+        with self._lock:
+            conn = self._connection()
+            owners = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT owner_pid FROM jobs WHERE status IN ('queued', 'running'){scope}", params
+            )]
+            dead = [pid for pid in owners if pid is None or not process_alive(pid)]
+            if not dead:
+                return 0
+            marks = ', '.join('?' for pid in dead if pid is not None) or 'NULL'
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?"
+                f" WHERE status IN ('queued', 'running'){scope}"
+                f" AND (owner_pid IS NULL OR owner_pid IN ({marks}))",
+                ('Interrupted: the server process running it stopped', time.time())
+                + params + tuple(pid for pid in dead if pid is not None)
+            )
+            conn.commit()
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'filename': row['filename'],
+            'progress': {
+                'current': row['progress_current'],
+                'total': row['progress_total']
+            },
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+        if row['error']:
+            job['error'] = row['error']
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        return job
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process with this id exists on this host"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill would terminate it; without a safe probe, assume it lives
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def init_worker() -> None:
+    import utils.document_parser
+
+    # Jobs and batch documents already run in parallel on this pool; a page
+    # pool per PDF inside each worker would oversubscribe the CPUs
+    utils.document_parser.PARALLEL_MIN_PAGES = sys.maxsize
+
+
+def run_job(db_path: str, job_id: str, file_path: str) -> None:
+    """
+    Entry point executed inside a pool worker process
+    """
+    from utils.pipeline import process_file
+
+    store = JobStore(db_path)
+    store.mark_running(job_id)
+    last_write = 0.0
+
+    def report(current, total):
+        nonlocal last_write
+        now = time.time()
+        if current == total or now - last_write >= PROGRESS_INTERVAL:
+            store.update_progress(job_id, current, total)
+            last_write = now
+
+    try:
+        result = process_file(file_path, progress=report)
+        store.finish(job_id, result=result)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        logger.error(traceback.format_exc())
+        store.finish(job_id, error=str(e))
+    finally:
+        remove_upload(file_path)
+
+
+def remove_upload(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove job upload {file_path}: {str(e)}")
+
+
+class JobManager:
+    """
+    Runs analysis jobs on a bounded process pool. The pool is created on the
+    first submission so importing the app never forks.
+
+    Every job records the process that submitted it, whose pool runs it.
+    Jobs still queued or running whose owner no longer exists are marked
+    failed when a manager starts and when their status is read; jobs of
+    live sibling processes are left alone. Admission only counts the jobs
+    this process has in flight, which the pool's done callbacks keep exact
+    even when a worker dies.
+    """
+
+    def __init__(self, db_path: str, max_workers: Optional[int] = None, max_pending: int = 64):
+        self.store = JobStore(db_path)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        orphaned = self.store.fail_orphaned()
+        if orphaned:
+            logger.warning(f"Marked {orphaned} jobs of stopped processes as failed")
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker)
+            return self._executor
+
+    def is_full(self) -> bool:
+        with self._pending_lock:
+            return self._pending >= self.max_pending
+
+    def submit(self, file_path: str, filename: str, job_id: Optional[str] = None) -> str:
+        """
+        Queue ``file_path`` for analysis and return the job id
+        """
+        job_id = job_id or uuid.uuid4().hex
+        self.store.create(job_id, filename, file_path)
+        with self._pending_lock:
+            self._pending += 1
+        future = self.executor.submit(run_job, self.store.db_path, job_id, file_path)
+
+        def on_done(done):
+            with self._pending_lock:
+                self._pending -= 1
+            # A crashed worker never gets to record its own failure or
+            # clean up after itself
+            error = done.exception()
+            if error is not None:
+                logger.error(f"Job {job_id} crashed: {error}")
+                self.store.finish(job_id, error=str(error))
+                remove_upload(file_path)
+
+        future.add_done_callback(on_done)
+        logger.info(f"Queued job {job_id} for {filename}")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        # Its owner may have died since this manager started
+        if job is not None and job['status'] in ('queued', 'running') and self.store.fail_orphaned(job_id):
+            job = self.store.get(job_id)
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,132 @@
+import logging
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordMatch(NamedTuple):
+    keyword: str
+    start: int
+    end: int
+    tags: Tuple[Hashable, ...]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed keyword set.
+
+    The automaton is built once and then finds every keyword occurrence in a
+    single left-to-right pass over the text, so the cost of a scan depends on
+    the text length rather than on the number of keywords. Failure links are
+    folded into a full transition table at build time, which keeps the scan
+    loop down to one dict lookup per character.
+
+    Keywords are matched against already-lowercased text. With
+    ``whole_words`` enabled (the default) a hit is only reported when it
+    starts a word, so 'ip' does not fire inside 'relationship'. The end is
+    left open so inflections still match: 'fee' fires in 'fees' and
+    'terminate' in 'terminated', as the plain substring checks did.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Hashable]], whole_words: bool = True):
+        self.whole_words = whole_words
+        self._tags: Dict[str, List[Hashable]] = {}
+        for keyword, tag in entries:
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            tags = self._tags.setdefault(keyword, [])
+            if tag not in tags:
+                tags.append(tag)
+
+        self._delta: List[Dict[str, int]] = []
+        self._out: List[Tuple[Tuple[str, int, Tuple[Hashable, ...]], ...]] = []
+        self._build()
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[str]] = [[]]
+
+        for keyword in self._tags:
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(keyword)
+
+        alphabet = {ch for keyword in self._tags for ch in keyword}
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+
+        # Breadth-first pass: every state's transitions are completed from its
+        # failure state, which is always shallower and therefore already done.
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            out[state].extend(out[fail[state]])
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    fail[nxt] = delta[fail[state]].get(ch, 0)
+                    delta[state][ch] = nxt
+                    queue.append(nxt)
+                else:
+                    target = delta[fail[state]].get(ch, 0)
+                    if target:
+                        delta[state][ch] = target
+
+        self._delta = delta
+        self._out = [
+            tuple((kw, len(kw), tuple(self._tags[kw])) for kw in keywords)
+            for keywords in out
+        ]
+        logger.debug(f"Built keyword automaton with {len(delta)} states for {len(self._tags)} keywords")
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._tags)
+
+    def finditer(self, text: str, start: int = 0, end: Optional[int] = None) -> Iterator[KeywordMatch]:
+        """
+        Yield every keyword occurrence in ``text[start:end]`` in order of end
+        position, with offsets into ``text``. The slice is scanned in place;
+        its start counts as a word boundary.
+        """
+        if end is None:
+            end = len(text)
+
+        delta = self._delta
+        out = self._out
+        whole_words = self.whole_words
+        state = 0
+
+        for i in range(start, end):
+            state = delta[state].get(text[i], 0)
+            if not out[state]:
+                continue
+            hit_end = i + 1
+            for keyword, size, tags in out[state]:
+                hit_start = hit_end - size
+                if whole_words and hit_start > start and _is_word_char(text[hit_start - 1]):
+                    continue
+                yield KeywordMatch(keyword, hit_start, hit_end, tags)
+
+    def tags_in(self, text: str, start: int = 0, end: Optional[int] = None) -> set:
+        """
+        Return the set of tags of all keywords occurring in ``text[start:end]``.
+        """
+        found = set()
+        for match in self.finditer(text, start, end):
+            found.update(match.tags)
+        return found
@@ -0,0 +1,136 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Bucket upper bounds (seconds) for stage timings
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bucket upper bounds (bytes) for payload sizes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+# Bucket upper bounds for clause counts
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by label values
+    """
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.labels:
+            values = [((), 0)]
+        for key, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two increments under
+    a lock, cheap enough for per-clause use.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {cumulative}')
+        return lines
+
+
+class Registry:
+    """
+    Process-local collection of metrics rendered in the Prometheus text
+    format. With several gunicorn workers each worker reports its own
+    values, so scrape them per worker or aggregate on the Prometheus side.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = TIME_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PARSE_SECONDS = REGISTRY.histogram(
+    'contractguard_parse_seconds', 'Time spent extracting text from a document')
+SPLIT_SECONDS = REGISTRY.histogram(
+    'contractguard_split_seconds', 'Time spent splitting a document into clauses')
+CLASSIFY_SECONDS = REGISTRY.histogram(
+    'contractguard_classify_clause_seconds', 'Time spent classifying a single clause')
+CLAUSES_PER_DOCUMENT = REGISTRY.histogram(
+    'contractguard_clauses_per_document', 'Number of clauses found per document', COUNT_BUCKETS)
+RESULT_BYTES = REGISTRY.histogram(
+    'contractguard_result_bytes', 'Size of analysis responses in bytes', SIZE_BUCKETS)
+BYTES_INGESTED = REGISTRY.counter(
+    'contractguard_bytes_ingested_total', 'Bytes of uploaded documents received')
+DOCUMENTS = REGISTRY.counter(
+    'contractguard_documents_total', 'Documents analysed, by endpoint and cache outcome', ('endpoint', 'cache'))
+PARSER_PAGES = REGISTRY.counter(
+    'contractguard_parser_pages_total', 'Pages extracted, by parser engine', ('engine',))
+PARSER_CHARACTERS = REGISTRY.counter(
+    'contractguard_parser_characters_total', 'Characters extracted, by parser engine', ('engine',))
+PARSER_SECONDS = REGISTRY.counter(
+    'contractguard_parser_seconds_total', 'Time spent in each parser engine', ('engine',))
+PARSER_FALLBACK_PAGES = REGISTRY.counter(
+    'contractguard_parser_fallback_pages_total',
+    'Pages whose text came from a fallback engine, by that engine', ('engine',))
+REVISION_CLAUSES = REGISTRY.counter(
+    'contractguard_revision_clauses_total',
+    'Clauses of revised uploads compared with an earlier analysis, by change', ('change',))
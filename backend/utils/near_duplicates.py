@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.clause_memo import normalize_clause
+
+logger = logging.getLogger(__name__)
+
+# Permutations per signature; BANDS * ROWS must equal NUM_PERM
+NUM_PERM = 128
+BANDS = 16
+ROWS = 8
+# Words per shingle
+SHINGLE_SIZE = 3
+# Estimated Jaccard similarity a candidate needs to be reported
+MIN_SIMILARITY = 0.8
+# Characters of the matched clause returned with a match
+PREVIEW_LENGTH = 300
+
+# Version of the signature scheme, kept in the index file; an index built
+# with another one is emptied, since its signatures are not comparable
+SIGNATURE_VERSION = 2
+
+# Largest prime below 2**32. With a, b and the 32-bit shingle hashes all
+# below 2**32, a * x + b stays below 2**64, so the permutations are exact
+# in uint64 arithmetic.
+_PRIME = np.uint64(4294967291)
+# Fixed seed: signatures are persisted and must be reproducible
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(normalized: str) -> List[bytes]:
+    """Overlapping word n-grams of a normalized clause"""
+    words = normalized.split()
+    if len(words) <= SHINGLE_SIZE:
+        return [' '.join(words).encode('utf-8')]
+    return [' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8') for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+def minhash(normalized: str) -> np.ndarray:
+    """
+    MinHash signature (NUM_PERM uint32 values) of a normalized clause. The
+    fraction of equal positions between two signatures estimates the
+    Jaccard similarity of their shingle sets.
+    """
+    values = np.array([zlib.crc32(shingle) for shingle in set(shingles(normalized))], dtype=np.uint64)
+    permuted = (np.outer(_PERM_A, values) + _PERM_B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """
+    One 63-bit bucket key per LSH band. Clauses sharing any key are
+    candidates; with 16 bands of 8 rows, pairs above ~0.7 Jaccard almost
+    always share one and pairs below ~0.4 almost never do.
+    """
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little') >> 1)
+    return keys
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash + LSH index of analysed clauses. Each distinct clause
+    is stored once with its signature and the document it was first seen
+    in; band buckets live in an indexed table, so a lookup touches a few
+    B-tree pages per band instead of scanning the corpus. Inserts only add
+    rows and never rebuild anything.
+    """
+
+    def __init__(self, db_path: str, min_similarity: float = MIN_SIMILARITY):
+        self.db_path = db_path
+        self.min_similarity = min_similarity
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork, so each process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS clauses ('
+                ' id INTEGER PRIMARY KEY,'
+                ' digest BLOB NOT NULL UNIQUE,'
+                ' document TEXT,'
+                ' document_key TEXT,'
+                ' clause_index INTEGER,'
+                ' preview TEXT,'
+                ' signature BLOB NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS bands ('
+                ' key INTEGER NOT NULL,'
+                ' clause_id INTEGER NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_bands_key ON bands (key)')
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != SIGNATURE_VERSION:
+                if self._conn.execute('SELECT 1 FROM clauses LIMIT 1').fetchone() is not None:
+                    logger.warning(f"Emptying near-duplicate index {self.db_path}: its signatures are outdated")
+                    self._conn.execute('DELETE FROM bands')
+                    self._conn.execute('DELETE FROM clauses')
+                self._conn.execute(f'PRAGMA user_version = {SIGNATURE_VERSION}')
+            self._conn.commit()
+        return self._conn
+
+    def add(self, document: str, document_key: str, clauses: Iterable[str]) -> int:
+        """
+        Index the clauses of one document and return how many were new
+        """
+        rows = []
+        for index, clause in enumerate(clauses):
+            normalized = normalize_clause(clause)
+            if not normalized:
+                continue
+            digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+            rows.append((digest, index, clause[:PREVIEW_LENGTH], minhash(normalized)))
+
+        added = 0
+        with self._lock:
+            conn = self._connection()
+            for digest, index, preview, signature in rows:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO clauses (digest, document, document_key, clause_index, preview, signature)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)',
+                    (digest, document, document_key, index, preview, signature.tobytes())
+                )
+                if cursor.rowcount:
+                    conn.executemany(
+                        'INSERT INTO bands (key, clause_id) VALUES (?, ?)',
+                        [(key, cursor.lastrowid) for key in band_keys(signature)]
+                    )
+                    added += 1
+            conn.commit()
+        return added
+
+    def query_many(self, clauses: List[str], limit: int = 3,
+                   exclude_document_key: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Return up to ``limit`` indexed clauses per input clause whose
+        estimated similarity reaches ``min_similarity``, best first
+        """
+        signatures = [minhash(normalize_clause(clause)) if clause.strip() else None for clause in clauses]
+        keys_per_clause = [band_keys(signature) if signature is not None else [] for signature in signatures]
+        all_keys = sorted({key for keys in keys_per_clause for key in keys})
+
+        with self._lock:
+            conn = self._connection()
+            buckets: Dict[int, List[int]] = {}
+            for i in range(0, len(all_keys), 900):
+                chunk = all_keys[i:i + 900]
+                for key, clause_id in conn.execute(
+                    f"SELECT key, clause_id FROM bands WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    buckets.setdefault(key, []).append(clause_id)
+
+            candidate_ids = sorted({clause_id for ids in buckets.values() for clause_id in ids})
+            candidates: Dict[int, Tuple] = {}
+            for i in range(0, len(candidate_ids), 900):
+                chunk = candidate_ids[i:i + 900]
+                for row in conn.execute(
+                    'SELECT id, document, document_key, clause_index, preview, signature FROM clauses'
+                    f" WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    candidates[row[0]] = row
+
+        results = []
+        for signature, keys in zip(signatures, keys_per_clause):
+            matches = []
+            ids = {clause_id for key in keys for clause_id in buckets.get(key, ())}
+            for clause_id in ids:
+                _, document, document_key, clause_index, preview, blob = candidates[clause_id]
+                if exclude_document_key and document_key == exclude_document_key:
+                    continue
+                similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+                if similarity >= self.min_similarity:
+                    matches.append({
+                        'document': document,
+                        'clause_index': clause_index,
+                        'similarity': round(similarity, 3),
+                        'text': preview,
+                    })
+            matches.sort(key=lambda match: match['similarity'], reverse=True)
+            results.append(matches[:limit])
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            clauses = conn.execute('SELECT COUNT(*) FROM clauses').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        size = page_count * page_size
+        return {
+            'clauses': clauses,
+            'bytes': size,
+            'bytes_per_clause': size / clauses if clauses else 0.0,
+            'min_similarity': self.min_similarity,
+        }
+
+
+def with_near_duplicates(index: Optional[NearDuplicateIndex], result: Dict, filename: Optional[str],
+                         document_key: str, index_document: bool) -> Dict:
+    """
+    Return a copy of ``result`` where every clause lists its near-duplicates
+    from previously analysed documents. With ``index_document`` the clauses
+    are then added to the index. Lookup failures are logged and leave the
+    result as it is.
+    """
+    if index is None or result['status'] != 'success':
+        return result
+    try:
+        texts = [clause['text'] for clause in result['clauses']]
+        matches = index.query_many(texts, exclude_document_key=document_key)
+        if index_document:
+            index.add(filename, document_key, texts)
+    except Exception as e:
+        logger.error(f"Near-duplicate lookup failed: {str(e)}")
+        return result
+    return dict(result, clauses=[
+        dict(clause, near_duplicates=found) for clause, found in zip(result['clauses'], matches)
+    ])
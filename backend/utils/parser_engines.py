@@ -0,0 +1,422 @@
+import io
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.metrics import PARSER_CHARACTERS, PARSER_FALLBACK_PAGES, PARSER_PAGES, PARSER_SECONDS
+from utils.text_decoding import detect_encoding, detect_encoding_full, iter_decoded, release_buffer, stream_buffer
+
+logger = logging.getLogger(__name__)
+
+# 'fast' tries the fastest engine first and falls back to higher-fidelity
+# ones page by page; 'fidelity' starts with the highest-fidelity engine
+PARSER_POLICY = os.environ.get('PARSER_POLICY', 'fast')
+
+# Share of unreadable characters above which a page counts as garbled
+GARBLED_THRESHOLD = float(os.environ.get('PARSER_GARBLED_THRESHOLD', 0.1))
+
+# Replacement and control characters, private-use glyphs and pdfminer's
+# placeholders for glyphs without a Unicode mapping
+_UNREADABLE = re.compile(r'[\x00-\x08\x0b\x0e-\x1f\ufffd\ue000-\uf8ff]|\(cid:\d+\)')
+
+
+def garbled_ratio(text: str) -> float:
+    """Fraction of a page's characters that could not be decoded"""
+    if not text:
+        return 0.0
+    return sum(1 for _ in _UNREADABLE.finditer(text)) / len(text)
+
+
+def needs_fallback(text: str) -> bool:
+    return not text.strip() or garbled_ratio(text) > GARBLED_THRESHOLD
+
+
+class ParserEngine:
+    """
+    Extracts text from one document format. A document is a sequence of
+    pages (DOCX and TXT documents have a single page), so that the pages a
+    fast engine gets wrong can be re-extracted by another one. ``speed``
+    and ``fidelity`` rank engines of the same format for the policies.
+    """
+
+    name = ''
+    format = ''
+    speed = 0
+    fidelity = 0
+
+    def open(self, stream: BinaryIO) -> Any:
+        """Parse the document structure and return a handle for the other methods"""
+        raise NotImplementedError
+
+    def page_count(self, handle: Any) -> int:
+        return 1
+
+    def extract_page(self, handle: Any, page_number: int) -> str:
+        raise NotImplementedError
+
+    def iter_page(self, handle: Any, page_number: int) -> Iterator[str]:
+        """
+        Yield the text of a page in chunks that concatenate to extract_page's
+        output, for engines that can stream a large page
+        """
+        yield self.extract_page(handle, page_number)
+
+    def close(self, handle: Any) -> None:
+        """Release what open() acquired beyond the stream itself"""
+
+
+class PyPDF2Engine(ParserEngine):
+    name = 'pypdf2'
+    format = 'pdf'
+    speed = 2
+    fidelity = 1
+
+    def open(self, stream):
+        from PyPDF2 import PdfReader
+        return PdfReader(stream)
+
+    def page_count(self, handle):
+        return len(handle.pages)
+
+    def extract_page(self, handle, page_number):
+        return handle.pages[page_number].extract_text()
+
+
+class PdfMinerEngine(ParserEngine):
+    """
+    pdfminer.six layout analysis: several times slower than PyPDF2 but
+    decodes more fonts and keeps reading order on multi-column pages
+    """
+
+    name = 'pdfminer'
+    format = 'pdf'
+    speed = 1
+    fidelity = 2
+
+    def open(self, stream):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        pages = list(PDFPage.create_pages(PDFDocument(PDFParser(stream))))
+        output = io.StringIO()
+        resources = PDFResourceManager(caching=True)
+        device = TextConverter(resources, output, laparams=LAParams())
+        return pages, output, PDFPageInterpreter(resources, device)
+
+    def page_count(self, handle):
+        return len(handle[0])
+
+    def extract_page(self, handle, page_number):
+        pages, output, interpreter = handle
+        output.seek(0)
+        output.truncate()
+        interpreter.process_page(pages[page_number])
+        # Every page ends with a form feed
+        return output.getvalue().rstrip('\x0c')
+
+
+class DocxEngine(ParserEngine):
+    name = 'python-docx'
+    format = 'docx'
+    speed = 1
+    fidelity = 1
+
+    def open(self, stream):
+        import docx
+        return docx.Document(stream)
+
+    def extract_page(self, handle, page_number):
+        return "".join(self.iter_page(handle, page_number))
+
+    def iter_page(self, handle, page_number):
+        for paragraph in handle.paragraphs:
+            yield paragraph.text + "\n"
+
+
+class TextEngine(ParserEngine):
+    """
+    Plain text in one decoding pass over a memory map of the file, in the
+    encoding detected from a bounded sample (see utils.text_decoding)
+    """
+
+    name = 'text'
+    format = 'txt'
+    speed = 2
+    fidelity = 1
+
+    def open(self, stream):
+        return stream_buffer(stream)
+
+    def encoding(self, handle) -> str:
+        return detect_encoding(handle)
+
+    def extract_page(self, handle, page_number):
+        return "".join(self.iter_page(handle, page_number))
+
+    def iter_page(self, handle, page_number):
+        return iter_decoded(handle, self.encoding(handle))
+
+    def close(self, handle):
+        release_buffer(handle)
+
+
+class ChardetEngine(TextEngine):
+    """Runs chardet over the whole file instead of a sample"""
+
+    name = 'chardet'
+    speed = 1
+    fidelity = 2
+
+    def encoding(self, handle):
+        return detect_encoding_full(handle)
+
+
+# Registered engines by format
+ENGINES: Dict[str, List[ParserEngine]] = {}
+
+
+def register_engine(engine: ParserEngine) -> None:
+    ENGINES.setdefault(engine.format, []).append(engine)
+
+
+for _engine in (PyPDF2Engine(), PdfMinerEngine(), DocxEngine(), TextEngine(), ChardetEngine()):
+    register_engine(_engine)
+
+
+def engines_for(file_format: str, policy: Optional[str] = None) -> List[ParserEngine]:
+    """
+    Engines for a format in the order the policy tries them
+    """
+    policy = policy or PARSER_POLICY
+    if file_format not in ENGINES:
+        raise ValueError(f"Unsupported file type: .{file_format}")
+    if policy not in ('fast', 'fidelity'):
+        raise ValueError(f"Unknown parser policy: {policy} (available: fast, fidelity)")
+    rank = (lambda engine: engine.speed) if policy == 'fast' else (lambda engine: engine.fidelity)
+    return sorted(ENGINES[file_format], key=rank, reverse=True)
+
+
+class PageExtractor:
+    """
+    Extracts the pages of one document with the engines the policy selects
+    for its format. Each page comes from the first engine; a page that is
+    empty, garbled or fails is re-extracted by the next engine, whose text
+    is kept when it reads better. Engines are opened on first use, so a
+    fallback engine costs nothing on documents that never need it.
+
+    Engines parse lazily and keep their own read position, so each one gets
+    a fresh stream from ``open_stream``; close() (or leaving a ``with``
+    block) closes them. Per-engine pages, characters and seconds are
+    collected in ``stats``; record() adds them to the process-wide engine
+    statistics.
+    """
+
+    def __init__(self, open_stream: Callable[[], BinaryIO], file_format: str, policy: Optional[str] = None):
+        self.open_stream = open_stream
+        self.engines = engines_for(file_format, policy)
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._handles: Dict[str, Any] = {}
+        self._failures: Dict[str, Exception] = {}
+        self._streams: List[BinaryIO] = []
+        self._count: Optional[int] = None
+
+    def close(self) -> None:
+        for engine in self.engines:
+            if engine.name in self._handles:
+                engine.close(self._handles[engine.name])
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+        self._handles = {}
+
+    def __enter__(self) -> 'PageExtractor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _stat(self, engine: ParserEngine) -> Dict[str, float]:
+        return self.stats.setdefault(
+            engine.name, {'pages': 0, 'characters': 0, 'seconds': 0.0, 'errors': 0, 'fallback_pages': 0}
+        )
+
+    def _handle(self, engine: ParserEngine) -> Any:
+        if engine.name in self._failures:
+            raise self._failures[engine.name]
+        if engine.name not in self._handles:
+            started = time.perf_counter()
+            try:
+                stream = self.open_stream()
+                self._streams.append(stream)
+                self._handles[engine.name] = engine.open(stream)
+            except Exception as e:
+                # A document one engine cannot open is not retried per page
+                self._failures[engine.name] = e
+                self._stat(engine)['errors'] += 1
+                raise
+            finally:
+                self._stat(engine)['seconds'] += time.perf_counter() - started
+        return self._handles[engine.name]
+
+    def page_count(self) -> int:
+        if self._count is None:
+            error = None
+            for engine in self.engines:
+                try:
+                    self._count = engine.page_count(self._handle(engine))
+                    break
+                except Exception as e:
+                    error = e
+            else:
+                raise error
+        return self._count
+
+    def _extract(self, engine: ParserEngine, page_number: int) -> str:
+        handle = self._handle(engine)
+        stat = self._stat(engine)
+        started = time.perf_counter()
+        try:
+            text = engine.extract_page(handle, page_number)
+        except Exception:
+            stat['errors'] += 1
+            raise
+        finally:
+            stat['seconds'] += time.perf_counter() - started
+        stat['pages'] += 1
+        stat['characters'] += len(text)
+        return text
+
+    def extract(self, page_number: int) -> Tuple[str, str]:
+        """
+        Return the text of a page and the name of the engine it came from
+        """
+        best: Optional[Tuple[str, str]] = None
+        error = None
+        for engine in self.engines:
+            try:
+                text = self._extract(engine, page_number)
+            except Exception as e:
+                logger.debug(f"{engine.name} failed on page {page_number + 1}: {str(e)}")
+                error = e
+                continue
+            if best is None or text.strip() and (
+                    not best[0].strip() or garbled_ratio(text) < garbled_ratio(best[0])):
+                if best is not None or error is not None:
+                    self._stat(engine)['fallback_pages'] += 1
+                best = (text, engine.name)
+            if not needs_fallback(best[0]):
+                break
+        if best is None:
+            raise error
+        return best
+
+    def _stream(self, engine: ParserEngine, page_number: int) -> Iterator[str]:
+        handle = self._handle(engine)
+        stat = self._stat(engine)
+        chunks = engine.iter_page(handle, page_number)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            except Exception:
+                stat['errors'] += 1
+                raise
+            finally:
+                stat['seconds'] += time.perf_counter() - started
+            if chunk is None:
+                break
+            stat['characters'] += len(chunk)
+            yield chunk
+        stat['pages'] += 1
+
+    def iter_page(self, page_number: int) -> Iterator[str]:
+        """
+        Yield the text of a page in chunks as the engine produces them (DOCX
+        paragraphs, blocks of decoded text), without holding the whole page.
+        Chunks already yielded cannot be taken back, so the fallback decision
+        is made on the opening text: an engine that fails before producing
+        text, or whose text up to the first non-blank chunk is empty or
+        garbled, is passed over for the next one. The last engine is
+        streamed as it reads; if it fails, the first engine passed over
+        that produced any text is streamed instead.
+        """
+        error = None
+        candidate = None
+        tried = False
+        for engine in self.engines:
+            chunks = self._stream(engine, page_number)
+            head = []
+            try:
+                for chunk in chunks:
+                    head.append(chunk)
+                    if chunk.strip():
+                        break
+            except Exception as e:
+                logger.debug(f"{engine.name} failed on page {page_number + 1}: {str(e)}")
+                error = e
+                tried = True
+                continue
+            if needs_fallback(''.join(head)) and engine is not self.engines[-1]:
+                chunks.close()
+                if candidate is None and ''.join(head).strip():
+                    candidate = engine
+                tried = True
+                continue
+            if tried:
+                self._stat(engine)['fallback_pages'] += 1
+            yield from head
+            yield from chunks
+            return
+        if candidate is None:
+            raise error
+        yield from self._stream(candidate, page_number)
+
+    def record(self) -> None:
+        record_engine_stats(self.stats)
+
+
+_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def record_engine_stats(stats: Dict[str, Dict[str, float]]) -> None:
+    """
+    Add per-engine counts from a PageExtractor, possibly one that ran in a
+    pool worker, to this process's statistics and metrics
+    """
+    with _stats_lock:
+        for name, values in stats.items():
+            total = _stats.setdefault(name, {key: 0 for key in values})
+            for key, value in values.items():
+                total[key] += value
+    for name, values in stats.items():
+        PARSER_PAGES.inc(values['pages'], engine=name)
+        PARSER_CHARACTERS.inc(values['characters'], engine=name)
+        PARSER_SECONDS.inc(values['seconds'], engine=name)
+        PARSER_FALLBACK_PAGES.inc(values['fallback_pages'], engine=name)
+
+
+def engine_stats() -> Dict[str, Dict]:
+    """
+    Registered engines with their throughput in this process
+    """
+    with _stats_lock:
+        recorded = {name: dict(values) for name, values in _stats.items()}
+    result = {}
+    for file_format, engines in ENGINES.items():
+        for engine in engines:
+            stats = recorded.get(engine.name, {'pages': 0, 'characters': 0, 'seconds': 0.0,
+                                               'errors': 0, 'fallback_pages': 0})
+            seconds = stats['seconds']
+            stats['pages_per_second'] = round(stats['pages'] / seconds, 2) if seconds else 0.0
+            stats['characters_per_second'] = round(stats['characters'] / seconds, 1) if seconds else 0.0
+            stats['seconds'] = round(seconds, 4)
+            result[engine.name] = dict(stats, format=file_format, speed=engine.speed, fidelity=engine.fidelity)
+    return result
@@ -0,0 +1,273 @@
+import os
+import time
+import random
+import logging
+import traceback
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.document_parser import parse_document, iter_document, source_name, source_size
+from utils.chunker import iter_clauses
+from utils.clause_spans import ClauseSpan, DocumentBuffer
+from utils.revisions import align_clauses, annotate_revision
+from utils.metrics import CLASSIFY_SECONDS, CLAUSES_PER_DOCUMENT, PARSE_SECONDS, SPLIT_SECONDS
+from models.classify_llm import classify_clause, classify_span, build_classification
+from models.backends import ClassifierBackend, get_backend, snapshot_backend
+from models.rule_pack import RuleSet
+
+logger = logging.getLogger(__name__)
+
+# Clauses per call when a batch classifier backend is selected
+BACKEND_BATCH_SIZE = 512
+
+# Fraction of documents whose per-clause progress is logged at INFO; all
+# other documents only log it at DEBUG
+VERBOSE_LOG_SAMPLE_RATE = float(os.environ.get('VERBOSE_LOG_SAMPLE_RATE', 0))
+
+def verbose_log_level():
+    """Pick the per-clause log level for one document"""
+    if VERBOSE_LOG_SAMPLE_RATE and random.random() < VERBOSE_LOG_SAMPLE_RATE:
+        return logging.INFO
+    return logging.DEBUG
+
+def classify_clause_result(clause: str, backend: Optional[ClassifierBackend] = None) -> Dict:
+    """
+    Classify a single clause and shape it as a response entry
+    """
+    try:
+        classification = (backend or get_backend()).classify_batch([clause])[0]
+        return {
+            'text': clause,
+            'type': classification['type'],
+            'risk_level': classification['risk_level'],
+            'explanation': classification['explanation'],
+            'specific_concerns': classification['specific_concerns']
+        }
+    except Exception as e:
+        logger.error(f"Error classifying clause: {str(e)}")
+        return {
+            'text': clause,
+            'type': 'Error',
+            'risk_level': 'Unknown',
+            'explanation': f'Error in classification: {str(e)}',
+            'specific_concerns': ['Error occurred during classification']
+        }
+
+def classify_document_span(document: DocumentBuffer, span: ClauseSpan, rules: RuleSet) -> None:
+    """
+    Classify a clause span, reading it from the shared lowercased buffer
+    """
+    if document.lower is not None:
+        span.type_id, span.risk_id = classify_span(document.lower, span.start, span.end, rules)
+    else:
+        classification = classify_clause(document.clause_text(span), rules)
+        span.type_id = rules.type_ids[classification['type']]
+        span.risk_id = rules.risk_ids[classification['risk_level']]
+
+def serialize_span(document: DocumentBuffer, span: ClauseSpan, backend: ClassifierBackend) -> Dict:
+    """
+    Materialize a classified span as a response entry. ``start`` and ``end``
+    are character offsets of the clause in the extracted document text.
+    """
+    clause = document.clause_text(span)
+    if span.type_id < 0:
+        entry = classify_clause_result(clause, backend)
+    else:
+        rules = backend.rules
+        entry = {'text': clause}
+        entry.update(build_classification(
+            rules.type_names[span.type_id], rules.risk_names[span.risk_id], clause, rules
+        ))
+    entry['start'] = span.start
+    entry['end'] = span.end
+    return entry
+
+def classify_document_batched(document: DocumentBuffer, backend,
+                              progress: Optional[Callable[[int, int], None]] = None,
+                              spans: Optional[List[ClauseSpan]] = None) -> None:
+    """
+    Classify the spans of a document (all of them unless ``spans`` is given)
+    with a batch backend, BACKEND_BATCH_SIZE clauses per call
+    """
+    spans = document.spans if spans is None else spans
+    for offset in range(0, len(spans), BACKEND_BATCH_SIZE):
+        batch = spans[offset:offset + BACKEND_BATCH_SIZE]
+        started = time.perf_counter()
+        ids = backend.classify_ids([document.clause_text(span) for span in batch])
+        elapsed = (time.perf_counter() - started) / len(batch)
+        for span, (type_id, risk_id) in zip(batch, ids):
+            span.type_id = type_id
+            span.risk_id = risk_id
+            CLASSIFY_SECONDS.observe(elapsed)
+        if progress is not None:
+            progress(offset + len(batch), len(spans))
+
+def process_file(file_path, progress: Optional[Callable[[int, int], None]] = None,
+                 previous: Optional[List[Dict]] = None):
+    """
+    Process the uploaded file (a path or a DocumentSource) and return
+    analysis results. ``progress`` is called with (clauses_done,
+    total_clauses) after each clause.
+
+    Clauses are kept as spans over the extracted text while they are
+    classified; their text is only built when the result is serialized.
+
+    ``previous`` is the clause list of an earlier analysis of another
+    version of the document, made with the same rules. Clauses found
+    unchanged in it are reused instead of classified again, and the result
+    flags each clause's change (see utils.revisions).
+    """
+    # One rule set for the whole document, even across a rule pack reload
+    backend = snapshot_backend()
+    rules = backend.rules
+    try:
+        # Extract text from document
+        started = time.perf_counter()
+        text = parse_document(file_path)
+        PARSE_SECONDS.observe(time.perf_counter() - started)
+
+        # Split into clauses
+        started = time.perf_counter()
+        document = DocumentBuffer(text)
+        spans = document.spans
+        SPLIT_SECONDS.observe(time.perf_counter() - started)
+        CLAUSES_PER_DOCUMENT.observe(len(spans))
+        logger.info(f"Extracted {len(text)} characters and {len(spans)} clauses from {source_name(file_path)}")
+
+        alignment = None
+        reused: Dict[int, Dict] = {}
+        pending = spans
+        if previous is not None:
+            alignment = align_clauses(
+                [clause['text'] for clause in previous], [document.clause_text(span) for span in spans]
+            )
+            # Clauses whose classification failed last time are retried
+            reused = {
+                index: previous[match] for index, match in alignment.unchanged().items()
+                if previous[match]['type'] != 'Error'
+            }
+            pending = [span for index, span in enumerate(spans) if index not in reused]
+            logger.info(f"Reusing {len(reused)} unchanged clauses, classifying {len(pending)}")
+
+        def serialize(index: int, span: ClauseSpan) -> Dict:
+            if index in reused:
+                return dict(reused[index], start=span.start, end=span.end)
+            return serialize_span(document, span, backend)
+
+        def finish() -> Dict:
+            result = {
+                'status': 'success',
+                'message': 'File processed successfully',
+                'rule_pack': rules.version_tag,
+                'clauses': [serialize(index, span) for index, span in enumerate(spans)]
+            }
+            if alignment is not None:
+                result = annotate_revision(result, previous, alignment)
+            return result
+
+        if backend.name != 'rules':
+            classify_document_batched(document, backend, progress, pending)
+            return finish()
+
+        # Classify each clause
+        level = verbose_log_level()
+        verbose = logger.isEnabledFor(level)
+        for i, span in enumerate(pending, 1):
+            started = time.perf_counter()
+            try:
+                classify_document_span(document, span, rules)
+                if verbose:
+                    logger.log(level, f"Clause {i}/{len(pending)} classified successfully")
+            except Exception as e:
+                logger.error(f"Error classifying clause {i}: {str(e)}")
+            CLASSIFY_SECONDS.observe(time.perf_counter() - started)
+            if progress is not None:
+                progress(i, len(pending))
+
+        return finish()
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        logger.error(traceback.format_exc())
+        return {
+            'status': 'error',
+            'message': f'Error processing file: {str(e)}',
+            'rule_pack': rules.version_tag,
+            'clauses': []
+        }
+
+def _timed(items, elapsed: List[float]) -> Iterator:
+    """
+    Pass items through, adding the time spent producing each one to
+    ``elapsed[0]``; the time the consumer spends between items is left out
+    """
+    items = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            elapsed[0] += time.perf_counter() - started
+            return
+        elapsed[0] += time.perf_counter() - started
+        yield item
+
+def iter_process_file(file_path) -> Iterator[Dict]:
+    """
+    Process the uploaded file incrementally.
+
+    Yields a 'metadata' event, then one 'clause' event per clause as soon as
+    it is classified, then a 'summary' trailer. The document is read, split
+    and classified incrementally and only per-type and per-risk counters are
+    kept, so memory stays bounded regardless of document size. Failures end
+    the stream with an 'error' event.
+    """
+    start_time = time.time()
+    backend = snapshot_backend()
+    yield {
+        'event': 'metadata',
+        'rule_pack': backend.rules.version_tag,
+        'filename': os.path.basename(source_name(file_path)),
+        'format': os.path.splitext(source_name(file_path))[1].lower().lstrip('.'),
+        'size': source_size(file_path)
+    }
+
+    type_counts = Counter()
+    risk_counts = Counter()
+    count = 0
+    # Parsing and splitting interleave, so their time is summed per chunk
+    # and per clause; splitting is whatever producing clauses took on top
+    # of parsing
+    parse_elapsed = [0.0]
+    clause_elapsed = [0.0]
+    try:
+        # Pages flow through the splitter as they are extracted, so only the
+        # clause being classified is held in memory
+        clauses = _timed(iter_clauses(_timed(iter_document(file_path), parse_elapsed)), clause_elapsed)
+        for index, clause in enumerate(clauses):
+            started = time.perf_counter()
+            entry = classify_clause_result(clause, backend)
+            CLASSIFY_SECONDS.observe(time.perf_counter() - started)
+            type_counts[entry['type']] += 1
+            risk_counts[entry['risk_level']] += 1
+            count += 1
+            entry['event'] = 'clause'
+            entry['index'] = index
+            yield entry
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        logger.error(traceback.format_exc())
+        yield {'event': 'error', 'message': f'Error processing file: {str(e)}'}
+        return
+
+    PARSE_SECONDS.observe(parse_elapsed[0])
+    SPLIT_SECONDS.observe(clause_elapsed[0] - parse_elapsed[0])
+    CLAUSES_PER_DOCUMENT.observe(count)
+    yield {
+        'event': 'summary',
+        'status': 'success',
+        'message': 'File processed successfully',
+        'clause_count': count,
+        'type_counts': dict(type_counts),
+        'risk_counts': dict(risk_counts),
+        'elapsed': round(time.time() - start_time, 3)
+    }
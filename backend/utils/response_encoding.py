@@ -0,0 +1,206 @@
+"""
+Shaping and encoding of analysis responses.
+
+A full analysis repeats the explanation and concern list of its clause type
+in every clause. The compact format interns clause types, risk levels,
+explanations and concern lists into tables once per response and refers to
+them by index. Clients can also keep only the clause fields they render and
+page through the clauses with an opaque cursor. Bodies are encoded as JSON
+(with orjson when it is installed) or MessagePack, and compressed with
+brotli or gzip, as negotiated from the request headers. orjson, msgpack and
+brotli are optional; without them responses fall back to plain JSON and
+gzip.
+"""
+import base64
+import binascii
+import gzip
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESS_MIN_SIZE', 1024))
+
+# Fast levels: large analyses compress well even at low effort
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Clauses per page when a cursor is given without a limit, and the largest
+# page a client may ask for
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Clause fields that the compact format replaces with table indices, and the
+# table each one goes to
+INTERNED_FIELDS = {
+    'type': 'types',
+    'risk_level': 'risk_levels',
+    'explanation': 'explanations',
+    'specific_concerns': 'concerns',
+}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseOptions(NamedTuple):
+    """How a client wants an analysis shaped; see parse_options()"""
+    compact: bool = False
+    fields: Optional[Tuple[str, ...]] = None
+    offset: Optional[int] = None
+    limit: Optional[int] = None
+
+    @property
+    def paginated(self) -> bool:
+        return self.offset is not None or self.limit is not None
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    """Offset of a cursor from encode_cursor(); ValueError if it is not one"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    prefix, _, offset = raw.partition(':')
+    if prefix != 'o' or not offset.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return int(offset)
+
+
+def parse_options(args) -> ResponseOptions:
+    """
+    Read the shaping options from query parameters (any mapping):
+    ``format=compact``, ``fields=text,type,...``, ``limit=N`` and
+    ``cursor=...``. Raises ValueError on invalid values.
+    """
+    response_format = args.get('format', 'full')
+    if response_format not in ('full', 'compact'):
+        raise ValueError(f"Unknown format: {response_format} (available: full, compact)")
+
+    fields = None
+    if args.get('fields'):
+        fields = tuple(field.strip() for field in args['fields'].split(',') if field.strip())
+
+    offset = decode_cursor(args['cursor']) if args.get('cursor') else None
+    limit = None
+    if args.get('limit'):
+        if not args['limit'].isdigit() or not 0 < int(args['limit']) <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        limit = int(args['limit'])
+    return ResponseOptions(response_format == 'compact', fields, offset, limit)
+
+
+def paginate(result: Dict, offset: int, limit: int) -> Dict:
+    """
+    Keep one page of clauses and describe it, with the cursor of the next
+    page (None on the last one)
+    """
+    clauses = result['clauses']
+    end = min(offset + limit, len(clauses))
+    page = {
+        'offset': offset,
+        'limit': limit,
+        'total': len(clauses),
+        'next_cursor': encode_cursor(end) if end < len(clauses) else None,
+    }
+    return dict(result, clauses=clauses[offset:end], page=page)
+
+
+def select_fields(clauses: List[Dict], fields: Tuple[str, ...]) -> List[Dict]:
+    return [{field: clause[field] for field in fields if field in clause} for clause in clauses]
+
+
+def compact_clauses(clauses: List[Dict]) -> Tuple[List[Dict], Dict[str, List]]:
+    """
+    Replace the repeated clause fields with indices into lookup tables.
+    Returns the clauses and the tables.
+    """
+    tables: Dict[str, List] = {}
+    indices: Dict[str, Dict] = {}
+    compacted = []
+    for clause in clauses:
+        entry = dict(clause)
+        for field, table in INTERNED_FIELDS.items():
+            if field not in entry:
+                continue
+            value = entry[field]
+            key = tuple(value) if isinstance(value, list) else value
+            index = indices.setdefault(table, {}).get(key)
+            if index is None:
+                values = tables.setdefault(table, [])
+                index = indices[table][key] = len(values)
+                values.append(value)
+            entry[field] = index
+        compacted.append(entry)
+    return compacted, tables
+
+
+def shape_result(result: Dict, options: ResponseOptions) -> Dict:
+    """
+    Apply pagination, field selection and the compact format, in that
+    order, to an analysis result
+    """
+    if result.get('status') != 'success':
+        return result
+    if options.paginated:
+        result = paginate(result, options.offset or 0, options.limit or DEFAULT_PAGE_SIZE)
+    if options.fields:
+        result = dict(result, clauses=select_fields(result['clauses'], options.fields))
+    if options.compact:
+        clauses, tables = compact_clauses(result['clauses'])
+        result = dict(result, format='compact', tables=tables, clauses=clauses)
+    return result
+
+
+def available_mimetypes() -> List[str]:
+    """Body encodings this process can produce, preferred first"""
+    return [JSON_MIMETYPE] + (list(MSGPACK_MIMETYPES) if msgpack is not None else [])
+
+
+def available_encodings() -> List[str]:
+    """Content codings this process can produce, preferred first"""
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def encode_body(payload, mimetype: str = JSON_MIMETYPE) -> bytes:
+    if mimetype in MSGPACK_MIMETYPES:
+        return msgpack.packb(payload, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def compress_body(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a body with the negotiated content coding. Returns the body and
+    the coding actually applied; small bodies are left alone.
+    """
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    return body, None
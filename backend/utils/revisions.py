@@ -0,0 +1,104 @@
+import difflib
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.metrics import REVISION_CLAUSES
+
+logger = logging.getLogger(__name__)
+
+# Per-clause keys that only describe a revision and are never cached
+REVISION_FIELDS = ('change', 'previous_index')
+
+
+def clause_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class Alignment(NamedTuple):
+    """
+    How the clauses of a revision line up with those of an earlier
+    analysis: for each new clause its change ('unchanged', 'modified' or
+    'inserted') and the index of the clause it came from, plus the indices
+    of previous clauses that were deleted
+    """
+    changes: List[Tuple[str, Optional[int]]]
+    deleted: List[int]
+
+    def unchanged(self) -> Dict[int, int]:
+        """Map new clause index to previous clause index for unchanged clauses"""
+        return {
+            index: previous for index, (change, previous) in enumerate(self.changes)
+            if change == 'unchanged'
+        }
+
+
+def align_clauses(previous: List[str], current: List[str]) -> Alignment:
+    """
+    Diff two clause lists on clause hashes. Runs of equal clauses are
+    unchanged; in a replaced run clauses are paired in order as modified,
+    and whatever is left over on either side is inserted or deleted.
+    """
+    matcher = difflib.SequenceMatcher(
+        None, [clause_digest(text) for text in previous], [clause_digest(text) for text in current],
+        autojunk=False
+    )
+    changes: List[Tuple[str, Optional[int]]] = []
+    deleted: List[int] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            changes.extend(('unchanged', i) for i in range(i1, i2))
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        changes.extend(('modified', i1 + k) for k in range(paired))
+        changes.extend(('inserted', None) for _ in range(j2 - j1 - paired))
+        deleted.extend(range(i1 + paired, i2))
+    return Alignment(changes, deleted)
+
+
+def annotate_revision(result: Dict, previous_clauses: List[Dict],
+                      alignment: Optional[Alignment] = None) -> Dict:
+    """
+    Return a copy of ``result`` where every clause is flagged with its
+    change against ``previous_clauses`` and a 'revision' summary lists the
+    counts and the deleted clauses
+    """
+    if result['status'] != 'success':
+        return result
+    if alignment is None:
+        alignment = align_clauses(
+            [clause['text'] for clause in previous_clauses], [clause['text'] for clause in result['clauses']]
+        )
+    clauses = []
+    for clause, (change, previous) in zip(result['clauses'], alignment.changes):
+        entry = dict(clause, change=change)
+        if previous is not None:
+            entry['previous_index'] = previous
+        clauses.append(entry)
+
+    counts = {'unchanged': 0, 'modified': 0, 'inserted': 0}
+    for change, _ in alignment.changes:
+        counts[change] += 1
+    counts['deleted'] = len(alignment.deleted)
+    for change, count in counts.items():
+        REVISION_CLAUSES.inc(count, change=change)
+
+    revision = dict(counts, deleted_clauses=[
+        {'previous_index': index, 'text': previous_clauses[index]['text']} for index in alignment.deleted
+    ])
+    return dict(result, clauses=clauses, revision=revision)
+
+
+def strip_revision(result: Dict) -> Dict:
+    """
+    The plain analysis of a revised document, as a full analysis of it would
+    have returned it
+    """
+    if 'revision' not in result:
+        return result
+    plain = {key: value for key, value in result.items() if key != 'revision'}
+    plain['clauses'] = [
+        {key: value for key, value in clause.items() if key not in REVISION_FIELDS}
+        for clause in result['clauses']
+    ]
+    return plain
@@ -0,0 +1,155 @@
+import codecs
+import io
+import logging
+import mmap
+import os
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bytes examined at each sampled region (start, middle and end of the file)
+# when detecting the encoding of a text file
+SAMPLE_BYTES = int(os.environ.get('TEXT_SAMPLE_BYTES', 64 * 1024))
+
+# Bytes fed to the chardet detector per step; it stops as soon as it is sure
+DETECT_BLOCK_SIZE = 8 * 1024
+
+# Bytes decoded per yielded chunk
+DECODE_CHUNK_SIZE = 64 * 1024
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def sample_regions(data, sample_bytes: int = SAMPLE_BYTES) -> List[memoryview]:
+    """
+    Up to three slices of a buffer: its start, middle and end. Files that fit
+    in three samples are returned whole.
+    """
+    view = memoryview(data)
+    if len(view) <= 3 * sample_bytes:
+        return [view]
+    middle = (len(view) - sample_bytes) // 2
+    return [view[:sample_bytes], view[middle:middle + sample_bytes], view[-sample_bytes:]]
+
+
+def _is_utf8(region: memoryview, at_start: bool) -> bool:
+    data = bytes(region)
+    if not at_start:
+        # A region cut out of the middle may start inside a multi-byte character
+        skip = 0
+        while skip < 3 and skip < len(data) and 0x80 <= data[skip] <= 0xBF:
+            skip += 1
+        data = data[skip:]
+    try:
+        # Not final: the region may also end inside a character
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _chardet(regions: List[memoryview]) -> Optional[str]:
+    """
+    Feed buffer regions to chardet's incremental detector a block at a time,
+    stopping as soon as it is confident
+    """
+    from chardet.universaldetector import UniversalDetector
+    detector = UniversalDetector()
+    for region in regions:
+        for offset in range(0, len(region), DETECT_BLOCK_SIZE):
+            detector.feed(bytes(region[offset:offset + DETECT_BLOCK_SIZE]))
+            if detector.done:
+                return detector.close().get('encoding')
+    return detector.close().get('encoding')
+
+
+def detect_encoding_full(data) -> str:
+    """
+    Detect the encoding of a whole text buffer with chardet. The buffer is
+    fed in blocks rather than copied, and detection stops early once chardet
+    is confident.
+    """
+    with memoryview(data) as view:
+        return _chardet([view]) or 'utf-8'
+
+
+def detect_encoding(data, sample_bytes: int = SAMPLE_BYTES) -> str:
+    """
+    Detect the encoding of a text buffer (bytes, memoryview or mmap) from a
+    bounded sample instead of the whole file: a byte-order mark decides
+    outright, a sample that is valid UTF-8 is taken as UTF-8, and anything
+    else goes to chardet's incremental detector, which stops as soon as it
+    is confident.
+    """
+    head = bytes(data[:4])
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    regions = sample_regions(data, sample_bytes)
+    if all(_is_utf8(region, index == 0) for index, region in enumerate(regions)):
+        return 'utf-8'
+
+    encoding = _chardet(regions)
+    if not encoding:
+        logger.warning("Could not detect text encoding, decoding as UTF-8")
+        return 'utf-8'
+    # A UTF-8 or ASCII guess on a sample that is not valid UTF-8 is wrong
+    name = codecs.lookup(encoding).name
+    return 'cp1252' if name in ('ascii', 'utf-8') else name
+
+
+def iter_decoded(data, encoding: Optional[str] = None,
+                 chunk_size: int = DECODE_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Decode a text buffer in one streaming pass and yield it in chunks of
+    about ``chunk_size`` bytes. Line endings are normalized to '\\n' as in
+    text-mode reads, and undecodable bytes become U+FFFD instead of failing
+    the document. The encoding is detected from a sample when not given.
+    """
+    encoding = encoding or detect_encoding(data)
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(encoding)(errors='replace'), translate=True
+    )
+    view = memoryview(data)
+    try:
+        for offset in range(0, len(view), chunk_size):
+            chunk = decoder.decode(view[offset:offset + chunk_size])
+            if chunk:
+                yield chunk
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+    finally:
+        view.release()
+
+
+def stream_buffer(stream):
+    """
+    The contents of a binary stream as a buffer, without copying where
+    possible: a memory map for real files, the underlying buffer for
+    in-memory streams. Release it with release_buffer().
+    """
+    raw = getattr(stream, 'raw', stream)
+    if hasattr(raw, 'getbuffer'):
+        return raw.getbuffer()
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return stream.read()
+    if os.fstat(fileno).st_size == 0:
+        return b''
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def release_buffer(buffer) -> None:
+    if isinstance(buffer, mmap.mmap):
+        buffer.close()
+    elif isinstance(buffer, memoryview):
+        buffer.release()
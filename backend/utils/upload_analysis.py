@@ -0,0 +1,89 @@
+"""
+The blocking part of /api/upload, shared by the Flask app (app.py) and the
+ASGI variant (asgi.py): once a request has been validated and its document
+ingested, both servers analyse it here and only encode the payload
+themselves.
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+from models.backends import analysis_version
+from utils.analysis_cache import AnalysisCache, digest_key, key_version
+from utils.ingest import IngestedUpload
+from utils.metrics import DOCUMENTS
+from utils.pipeline import process_file
+from utils.response_encoding import DEFAULT_PAGE_SIZE, ResponseOptions, paginate, shape_result
+from utils.revisions import annotate_revision, strip_revision
+
+logger = logging.getLogger(__name__)
+
+
+def store_analysis(store, analysis_id: str, filename: str, result: Dict) -> None:
+    """Add an analysis to the search store; failures are logged, never raised"""
+    if store is None or not analysis_id:
+        return
+    try:
+        store.add(analysis_id, filename, result)
+    except Exception as e:
+        logger.error(f"Could not store analysis {analysis_id}: {str(e)}")
+
+
+def shape_analysis(result: Dict, options: ResponseOptions, near_duplicates, filename: Optional[str],
+                   document_key: str, index_document: bool) -> Dict:
+    """
+    Shape an analysis for the response. Unless the document is being added
+    to the near-duplicate index, the clauses are paginated first so that
+    near-duplicates are only looked up for the requested page.
+    """
+    if options.paginated and not index_document and result['status'] == 'success':
+        result = paginate(result, options.offset or 0, options.limit or DEFAULT_PAGE_SIZE)
+        options = options._replace(offset=None, limit=None)
+    if near_duplicates is not None:
+        from utils.near_duplicates import with_near_duplicates
+        result = with_near_duplicates(near_duplicates, result, filename, document_key, index_document)
+    return shape_result(result, options)
+
+
+def analyze_ingested_upload(upload: IngestedUpload, options: ResponseOptions, cache: AnalysisCache,
+                            store=None, near_duplicates=None, previous_id: Optional[str] = None,
+                            previous: Optional[Dict] = None) -> Tuple[Dict, bool]:
+    """
+    Analyse an ingested upload: reuse the cached analysis of the same
+    content when there is one, otherwise run the pipeline (reclassifying
+    only the changed clauses of a revision of ``previous``, the analysis
+    stored as ``previous_id``) and cache the result. The analysis is added
+    to the search store and the near-duplicate index. Returns the response
+    payload shaped by ``options`` and whether it came from the cache.
+    """
+    version = analysis_version()
+    cache_key = digest_key(upload.digest, version)
+    document_key = upload.digest
+    result = cache.get(cache_key)
+    cache_hit = result is not None
+    if cache_hit:
+        logger.info(f"Returning cached analysis for {upload.filename}")
+        DOCUMENTS.inc(endpoint='upload', cache='hit')
+        if previous is not None:
+            result = annotate_revision(result, previous['clauses'])
+    else:
+        DOCUMENTS.inc(endpoint='upload', cache='miss')
+        # Clauses of a previous analysis are only reused when it was made
+        # with the current rules and backend
+        if previous is not None and key_version(previous_id) == version:
+            result = process_file(upload.source, previous=previous['clauses'])
+        else:
+            result = process_file(upload.source)
+            if previous is not None:
+                result = annotate_revision(result, previous['clauses'])
+        logger.info(f"File processing completed: {result['status']}, {len(result['clauses'])} clauses")
+
+    if result['status'] == 'success':
+        if not cache_hit:
+            cache.put(cache_key, strip_revision(result))
+        store_analysis(store, cache_key, upload.filename, result)
+        result = dict(result, analysis_id=cache_key)
+    if 'revision' in result:
+        result['revision']['previous_analysis_id'] = previous_id
+
+    payload = shape_analysis(result, options, near_duplicates, upload.filename, document_key, not cache_hit)
+    return payload, cache_hit